@@ -1,84 +1,15 @@
 import os
+import argparse
+import copy
+import functools
+import hashlib
+import json
 import xml.etree.ElementTree as ET
-import xml.dom.minidom
 
-def save_xml_pretty(input_file, output_dir):
-    # Write pretty XML to file
-    try:
-        tree = ET.parse(input_file)
-        
-        xml_str = ET.tostring(tree.getroot(), encoding='unicode')
-        dom = xml.dom.minidom.parseString(xml_str)
-        pretty_xml = dom.toprettyxml(indent="    ")
-        
-        base_name = os.path.basename(input_file)
-        output_file = os.path.join(output_dir, base_name)
-        
-
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write(pretty_xml)
-            
-        #print(f"Successfully pretty printed: {base_name}")
-        
-    except Exception as e:
-        print(f"Error processing {input_file}: {str(e)}")
-
-def iterate_xml_files(directory='.'):
-    # Get all XML files in the directory and sort them alphabetically
-    xml_files = sorted([f for f in os.listdir(directory) if f.endswith('.xml')])
-    
-    if not xml_files:
-        print("No XML files found in the directory.")
-        return
-    
-    total_items = 0
-    
-    # Create output directory if it doesn't exist
-    output_dir = 'suru_pretty'
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-    print(f"Prettified xml files will be saved in: {output_dir}")
-
-    # Analyze each XML file
-    for xml_file in xml_files:
-        try:
-            # Parse the XML file
-            tree = ET.parse(os.path.join(directory, xml_file))
-            root = tree.getroot()
-            
-            # Count DictionaryEntry elements in the XML file
-            item_count = len(root.findall(".//DictionaryEntry"))
-            
-            print(f"{xml_file}, DictionaryEntry tags: {item_count}")
-            total_items += item_count
-            
-            # Pretty print the XML file
-            save_xml_pretty(os.path.join(directory, xml_file), output_dir)
-            
-        except ET.ParseError as e:
-            print(f"Error parsing {xml_file}: {str(e)}")
-        except Exception as e:
-            print(f"Error processing {xml_file}: {str(e)}")
-
-    print(f"Total DictionaryEntry items: {total_items} in {len(xml_files)} files")
-
-def collect_tags(element):
-    """Recursively collect unique tags and their structure from the XML element."""
-    tag_structure = {}
-    for child in element:
-        tag_structure[child.tag] = collect_tags(child)  # Recur for sub-children
-    return tag_structure
-
-def write_template(tag_structure, file, indent=0):
-    """Write the hierarchical template to the file."""
-    for tag, children in tag_structure.items():
-        file.write('  ' * indent + f'<{tag}>\n')
-        if children:  # If there are sub-children, write them recursively
-            write_template(children, file, indent + 1)
-        file.write('  ' * indent + f'</{tag}>\n')
+import metrics
+from suru_parallel import add_jobs_argument, map_files
 
-import os
-import xml.etree.ElementTree as ET
+MANIFEST_NAME = 'manifest.json'
 
 def collect_tags(element):
     """
@@ -113,18 +44,120 @@ def write_template(structure, f, indent=0):
         write_template(children, f, indent + 1)
         f.write(f"{spacing}</{tag}>\n")
 
-def create_structure_overview(input_dir_path="suru"):
+def file_stat(xml_path):
+    stat = os.stat(xml_path)
+    return stat.st_mtime_ns, stat.st_size
+
+def file_sha256(xml_path):
+    with open(xml_path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def load_manifest(output_dir):
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path, encoding='utf-8') as f:
+        return json.load(f)
+
+def save_manifest(manifest, output_dir):
+    with open(os.path.join(output_dir, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False)
+
+def is_up_to_date(xml_path, output_dir, entry):
+    """
+    A file is up to date if its prettified copy exists and it is unchanged since
+    the manifest entry was written: same mtime and size, or same content hash.
+    """
+    if entry is None or not os.path.exists(os.path.join(output_dir, os.path.basename(xml_path))):
+        return False
+    mtime_ns, size = file_stat(xml_path)
+    if entry['mtime_ns'] == mtime_ns and entry['size'] == size:
+        return True
+    if entry['size'] == size and entry['sha256'] == file_sha256(xml_path):
+        # Touched but not modified, remember the new mtime
+        entry['mtime_ns'] = mtime_ns
+        return True
+    return False
+
+def process_file(xml_path, output_dir):
+    """
+    Parse one file once and from that tree
+    1. count DictionaryEntry elements,
+    2. write an indented copy to output_dir,
+    3. collect the merged tag structure of its DictionaryEntry elements.
+    Returns a manifest entry, or None if the file could not be processed.
+    """
+    try:
+        mtime_ns, size = file_stat(xml_path)
+        with open(xml_path, 'rb') as f:
+            data = f.read()
+        root = ET.fromstring(data)
+
+        entries = root.findall(".//DictionaryEntry")
+        structure = {}
+        for entry in entries:
+            structure = merge_structures(structure, collect_tags(entry))
+
+        # Indent in place and serialise straight to file, no DOM round-trip
+        tree = ET.ElementTree(root)
+        ET.indent(tree, space="    ")
+        tree.write(os.path.join(output_dir, os.path.basename(xml_path)), encoding='utf-8', xml_declaration=True)
+
+        return {
+            'mtime_ns': mtime_ns,
+            'size': size,
+            'sha256': hashlib.sha256(data).hexdigest(),
+            'count': len(entries),
+            'structure': structure,
+        }
+
+    except ET.ParseError as e:
+        print(f"Error parsing {os.path.basename(xml_path)}: {str(e)}")
+    except Exception as e:
+        print(f"Error processing {os.path.basename(xml_path)}: {str(e)}")
+    return None
+
+def create_overview(directory='suru', output_dir='suru_pretty', jobs=1):
+    # Get all XML files in the directory and sort them alphabetically
+    xml_files = sorted([f for f in os.listdir(directory) if f.endswith('.xml')])
+
+    if not xml_files:
+        print("No XML files found in the directory.")
+        return
+
+    # Create output directory if it doesn't exist
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    print(f"Prettified xml files will be saved in: {output_dir}")
+
+    manifest = load_manifest(output_dir)
+    stale = [os.path.join(directory, f) for f in xml_files
+             if not is_up_to_date(os.path.join(directory, f), output_dir, manifest.get(f))]
+    print(f"{len(xml_files) - len(stale)} files up to date, {len(stale)} to process")
+
+    worker = functools.partial(process_file, output_dir=output_dir)
+    with metrics.stage('parse and prettify'):
+        for xml_path, entry in map_files(worker, stale, jobs):
+            name = os.path.basename(xml_path)
+            if entry is None:
+                manifest.pop(name, None)
+            else:
+                manifest[name] = entry
+    # Forget files that are no longer in the input directory
+    manifest = {name: manifest[name] for name in xml_files if name in manifest}
+    save_manifest(manifest, output_dir)
+
+    # Merge in sorted filename order so tag order does not depend on what was cached
+    total_items = 0
     master_structure = {}
-    
-    for filename in sorted(f for f in os.listdir(input_dir_path) if f.endswith('.xml')):
-        file_path = os.path.join(input_dir_path, filename)
-        print(f'Processing for structure overview: {file_path}')
-        tree = ET.parse(file_path)
-        root = tree.getroot()
+    for name in xml_files:
+        if name not in manifest:
+            continue
+        print(f"{name}, DictionaryEntry tags: {manifest[name]['count']}")
+        total_items += manifest[name]['count']
+        master_structure = merge_structures(master_structure, copy.deepcopy(manifest[name]['structure']))
 
-        for entry in root.findall('.//DictionaryEntry'):
-            entry_structure = collect_tags(entry)
-            master_structure = merge_structures(master_structure, entry_structure)
+    print(f"Total DictionaryEntry items: {total_items} in {len(xml_files)} files")
 
     with open('02_xml_structure.xml', 'w', encoding='utf-8') as f:
         f.write('<DictionaryEntry>\n')
@@ -135,6 +168,9 @@ def create_structure_overview(input_dir_path="suru"):
 
 
 if __name__ == "__main__":
-    path = "suru"
-    iterate_xml_files(path) # analyze and prettify 
-    create_structure_overview(path) # create a structure overview
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Count, prettify and compile structure of SuRu XML files")
+    add_jobs_argument(parser)
+    args = parser.parse_args()
+    metrics.report_at_exit('02_overview')
+
+    create_overview("suru", "suru_pretty", args.jobs) # count, prettify and create a structure overview in one pass
@@ -1,9 +1,22 @@
 import os
+import argparse
+import hashlib
+import itertools
+import json
 from pathlib import Path
 import xml.etree.ElementTree as ET
-from typing import List, Dict, Any
+from typing import Iterable, Iterator, List, Dict, Any
 import pandas as pd
 
+import entry_store
+import metrics
+import search_index
+import translation_index
+from suru_parallel import add_jobs_argument, map_files, stream_files
+from suru_store import add_xlsx_argument, change_set, export_xlsx, read_previous, write_table
+
+COLUMNS = ['suru_id', 'headword', 'subcategorisation', 'ks', 'seealso', 'translations', 'sense_groups', 'content_hash']
+
 def get_xml_files(directory_path: str) -> list[str]:
     dir_path = Path(directory_path)
     if not dir_path.exists():
@@ -11,127 +24,157 @@ def get_xml_files(directory_path: str) -> list[str]:
     xml_files = list(dir_path.glob("*.xml"))
     return sorted([str(file) for file in xml_files])
 
-def process_xml_entries(xml_files: list[str]) -> List[Dict[str, Any]]:
-    results = []
-    
+def extract_entry(entry: ET.Element) -> Dict[str, Any]:
+    """
+    Extract one flat record from a DictionaryEntry element.
+    translations is a list of all Translation texts, sense_groups a list with
+    the Translation texts of each SenseGrp, in document order.
+    """
+    record = {
+        'suru_id': entry.get('id'),
+        'headword': None,
+        'subcategorisation': None,
+        'ks': None,
+        'seealso': None,
+        'translations': [],
+        'sense_groups': []
+    }
+
+    # Process HeadwordCtn
+    headword_ctn = entry.find('.//HeadwordCtn')
+    if headword_ctn is not None:
+        headword = headword_ctn.find('Headword')
+        if headword is not None:
+            record['headword'] = headword.text
+
+        subcat = headword_ctn.find('Subcategorisation')
+        if subcat is not None:
+            record['subcategorisation'] = subcat.text
+
+        ks = headword_ctn.find('SeeAlso')
+        if ks is not None:
+            record['ks'] = ks.get('style', '')
+
+    seealso = entry.find('.//SeeAlso/Ptr')
+    if seealso is not None and seealso.get('style') == 'viittaus':
+        record['seealso'] = seealso.text
+        print(f"SeeAlso: {seealso.text}")
+
+    # Combine translations of all TranslationBlocks into one list
+    for translation_block in entry.findall('.//TranslationBlock'):
+        translations = translation_block.findall('.//TranslationCtn/Translation')
+        record['translations'].extend(trans.text for trans in translations if trans.text)
+
+    # Process SenseGrp, one list per group so group n is the nth SenseGrp
+    for sense_group in entry.findall('.//SenseGrp'):
+        translations = sense_group.findall('.//TranslationCtn/Translation')
+        record['sense_groups'].append([trans.text for trans in translations if trans.text])
+
+    record['content_hash'] = content_hash(record)
+    return record
+
+def content_hash(record: Dict[str, Any]) -> str:
+    """
+    Stable hash of the extracted values of an entry, used to find entries
+    changed between SuRu releases.
+    """
+    data = json.dumps(record, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+def iter_xml_entries(xml_files: list[str]) -> Iterator[Dict[str, Any]]:
+    """
+    Stream flat records for every DictionaryEntry in xml_files.
+    Uses iterparse and clears each entry once extracted, so memory is bounded
+    by one entry rather than by a whole file or the whole corpus.
+    """
     for xml_file in xml_files:
+        print(f"Processing file: {xml_file}")
+        entry_count = 0
         try:
-            tree = ET.parse(xml_file)
-            root = tree.getroot()
-            entries = root.findall('.//DictionaryEntry')
-            
-            print(f"Processing file: {xml_file}")
-            print(f"Found {len(entries)} DictionaryEntry elements")
-            
-            for entry in entries:
-                entry_dict = {
-                    'suru_id': entry.get('id'),
-                    'headword': None,
-                    'subcategorisation': None,
-                    'ks': None,
-                    'seealso': None,
-                    'translations': [],
-                    'sense_groups': []
-                }
-                
-                # Process HeadwordCtn
-                headword_ctn = entry.find('.//HeadwordCtn')
-                if headword_ctn is not None:
-                    headword = headword_ctn.find('Headword')
-                    if headword is not None:
-                        entry_dict['headword'] = headword.text
-                    
-                    subcat = headword_ctn.find('Subcategorisation')
-                    if subcat is not None:
-                        entry_dict['subcategorisation'] = subcat.text
-                    
-                    ks = headword_ctn.find('SeeAlso')
-                    if ks is not None:
-                        entry_dict['ks'] = ks.get('style', '')
-                
-                seealso = entry.find('.//SeeAlso/Ptr')
-                if seealso is not None and seealso.get('style') == 'viittaus':
-                    entry_dict['seealso'] = seealso.text
-                    print(f"SeeAlso: {seealso.text}")
-
-                translation_blocks = entry.findall('.//TranslationBlock')
-                for translation_block in translation_blocks:
-                    translations = translation_block.findall('.//TranslationCtn/Translation')
-                    translations_list = [trans.text for trans in translations if trans.text]
-                    if translations_list:
-                        entry_dict['translations'].append(translations_list)
-
-                # Process SenseGrp
-                sense_groups = entry.findall('.//SenseGrp')
-                for sense_group in sense_groups:
-                    translations = sense_group.findall('.//TranslationCtn')
-                    translations_list = [trans.text for trans in translations if trans.text]
-                    if translations_list:
-                        entry_dict['sense_groups'].append(translations_list)
-                
-                results.append(entry_dict)
-                
+            context = ET.iterparse(xml_file, events=('start', 'end'))
+            _, root = next(context)
+            for event, elem in context:
+                if event == 'end' and elem.tag == 'DictionaryEntry':
+                    entry_count += 1
+                    yield extract_entry(elem)
+                    # Drop the processed entry and detach it from the tree
+                    elem.clear()
+                    root.clear()
         except ET.ParseError as e:
             print(f"Error parsing {xml_file}: {e}")
         except Exception as e:
             print(f"Error processing {xml_file}: {e}")
-    
-    return results
-
-def save_to_xlsx(results: List[Dict[str, Any]], output_file: str) -> None:
-    flat_data = []
-    for entry in results:
-        # Create a base entry with the main fields
-        base_entry = {
-            'suru_id': entry['suru_id'],
-            'headword': entry['headword'],
-            'subcategorisation': entry['subcategorisation'],
-            'ks': entry['ks'],
-            'seealso': entry['seealso']
-        }
-        
-        # Combine all translations into a single string
-        all_translations = []
-        for trans_list in entry['translations']:
-            all_translations.extend(trans_list)
-        base_entry['translations'] = '; '.join(all_translations)
-        
-        # Combine all sense groups into a single string
-        all_senses = []
-        for sense_list in entry['sense_groups']:
-            all_senses.extend(sense_list)
-        base_entry['sense_groups'] = '; '.join(all_senses)
-            
-        flat_data.append(base_entry)
-    
-    # Create DataFrame and save to Excel
-    df = pd.DataFrame(flat_data)
-    df.to_excel(output_file, index=False)
-    print(f"Results saved to {output_file}")
-
-xml_files = get_xml_files("suru")
-results = process_xml_entries(xml_files)
-
-print("First 5 results:")
-for result in results[:5]:
-    print(result)
-
-print(f"Total results: {len(results)}")
-
-# Count entries with 'ks' value
-ks_count = sum(1 for result in results if result['ks'] is not None)
-print(f"Number of entries with 'ks' value: {ks_count}")
-
-# Count entries with 'seealso' value
-seealso_count = sum(1 for result in results if result['seealso'] is not None)
-print(f"Number of entries with 'seealso' value: {seealso_count}")
-
-# Count entries with translations
-translations_count = sum(1 for result in results if result['translations'])
-print(f"Number of entries with translations: {translations_count}")
-
-# Count entries with sense_groups
-sense_groups_count = sum(1 for result in results if result['sense_groups'])
-print(f"Number of entries with sense_groups: {sense_groups_count}")
-
-save_to_xlsx(results, "03_suru.xlsx")
\ No newline at end of file
+        print(f"Found {entry_count} DictionaryEntry elements")
+
+def extract_file(xml_file: str) -> List[Dict[str, Any]]:
+    """
+    Extract all records of a single file. Used as the per-file worker for map_files.
+    """
+    return list(iter_xml_entries([xml_file]))
+
+def count_entries(records: Iterable[Dict[str, Any]], counts: Dict[str, int]) -> Iterator[Dict[str, Any]]:
+    """
+    Pass records through unchanged while updating counts, so statistics are
+    gathered in the same pass that writes the output.
+    """
+    for record in records:
+        counts['total'] += 1
+        if counts['total'] <= 5:
+            print(f"Result {counts['total']}: {record}")
+        if record['ks'] is not None:
+            counts['ks'] += 1
+        if record['seealso'] is not None:
+            counts['seealso'] += 1
+        if record['translations']:
+            counts['translations'] += 1
+        if any(record['sense_groups']):
+            counts['sense_groups'] += 1
+        yield record
+
+def save_records(records: Iterable[Dict[str, Any]], name: str, xlsx: bool = False) -> pd.DataFrame:
+    # Create DataFrame from the record stream and save as Parquet
+    df = pd.DataFrame.from_records(records, columns=COLUMNS)
+    write_table(df, name)
+    if xlsx:
+        export_xlsx(df, name)
+    return df
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract SuRu DictionaryEntry data to 03_suru.parquet")
+    add_jobs_argument(parser)
+    add_xlsx_argument(parser)
+    args = parser.parse_args()
+    metrics.report_at_exit('03_suru')
+
+    xml_files = get_xml_files("suru")
+    counts = {'total': 0, 'ks': 0, 'seealso': 0, 'translations': 0, 'sense_groups': 0}
+
+    if args.jobs == 1:
+        # Streamed entry by entry, with the same per-file timings as the parallel path
+        records = stream_files(lambda xml_file: iter_xml_entries([xml_file]), xml_files)
+    else:
+        # Per-file results are merged back in sorted filename order
+        records = itertools.chain.from_iterable(
+            file_records for _, file_records in map_files(extract_file, xml_files, args.jobs))
+    # Hashes of the previous extraction, to compare the new release with
+    previous = read_previous("03_suru", columns=['suru_id', 'content_hash'])
+    with metrics.stage('extract'):
+        df = save_records(count_entries(records, counts), "03_suru", args.xlsx)
+    if previous is not None:
+        changes = change_set(df, previous)
+        write_table(changes, "03_changes")
+        counts_by_change = changes['change'].value_counts()
+        print(f"Changes since the previous extraction: {counts_by_change.get('added', 0)} added, "
+              f"{counts_by_change.get('modified', 0)} modified, {counts_by_change.get('removed', 0)} removed")
+    with metrics.stage('translation index'):
+        translation_index.build_index(df)
+    with metrics.stage('entry store'):
+        entry_store.build_store(df)
+    with metrics.stage('search index'):
+        search_index.build_index(df)
+
+    print(f"Total results: {counts['total']}")
+    print(f"Number of entries with 'ks' value: {counts['ks']}")
+    print(f"Number of entries with 'seealso' value: {counts['seealso']}")
+    print(f"Number of entries with translations: {counts['translations']}")
+    print(f"Number of entries with sense_groups: {counts['sense_groups']}")
@@ -1,11 +1,25 @@
-import pandas as pd
+import argparse
+import os
 
-# Read the Excel file
-suru_df = pd.read_excel('03_suru.xlsx')
+import metrics
+from suru_store import (add_xlsx_argument, combine, export_xlsx, print_incremental, read_previous, read_table,
+                        split_changed, table_path, write_table)
+from word_categories import load_index, lookup_categories, print_match_rates
 
-# Read the TSV file (which has .txt extension)
-# Since it's a TSV file, we'll use tab as the separator
-nykysuomi_df = pd.read_csv('nykysuomensanalista2024.txt', sep='\t')
+parser = argparse.ArgumentParser(description="Add Finnish word category to the SuRu table")
+parser.add_argument('--incremental', action='store_true',
+                    help='Only process entries new or changed since the previous 04_cat and keep the rest')
+add_xlsx_argument(parser)
+args = parser.parse_args()
+metrics.report_at_exit('04_cat')
+
+# Read the output of step 3
+with metrics.stage('read'):
+    suru_df = read_table('03_suru')
+
+# Word categories of Nykysuomen sanalista by normalized headword, rebuilt when the list changes
+with metrics.stage('word category index'):
+    index = load_index('nykysuomensanalista2024.txt')
 
 # Display basic information about the dataframes
 print("\nSURU DataFrame Info:")
@@ -13,20 +27,35 @@ print(suru_df.info())
 print("\nFirst few rows of SURU data:")
 print(suru_df.head())
 
-print("\nNykysuomen sanalista DataFrame Info:")
-print(nykysuomi_df.info())
-print("\nFirst few rows of Nykysuomen sanalista data:")
-print(nykysuomi_df.head())
+print(f"\nNykysuomen sanalista index: {len(index)} words")
+
+previous = read_previous('04_cat') if args.incremental else None
+# Previous categories are only valid for the same word list
+if previous is not None and os.path.getmtime('nykysuomensanalista2024.txt') >= os.path.getmtime(table_path('04_cat')):
+    print("Word list changed since the previous run, processing all entries")
+    previous = None
+if previous is not None:
+    full_df = suru_df
+    suru_df, kept = split_changed(full_df, previous)
 
-# Merge the dataframe on column headword in suku_df and "Hakusana" in nykysuomi_df
-merged_df = pd.merge(suru_df, nykysuomi_df, left_on='headword', right_on='Hakusana', how='left')
+# One row per entry; Sanaluokka is the list of categories of the headword
+suru_df = suru_df.copy()
+with metrics.stage('category lookup'):
+    suru_df['Sanaluokka'], stats = lookup_categories(suru_df['headword'], index)
+print_match_rates(stats)
+
+if previous is not None:
+    print_incremental(len(kept), len(suru_df), '04_cat')
+    suru_df = combine(full_df, kept, suru_df)
 
 # Display the merged dataframe
 print("\nMerged DataFrame:")
-print(merged_df.head())
+print(suru_df.head())
 
-# Save the merged dataframe to a new Excel file
-merged_df.to_excel('04_cat.xlsx', index=False)
+# Save the merged dataframe
+with metrics.stage('write'):
+    write_table(suru_df, '04_cat')
+    if args.xlsx:
+        export_xlsx(suru_df, '04_cat')
 
-print("\nMerged dataframe saved to '04_cat.xlsx'")
-print(f"Total rows: {len(merged_df)}")
\ No newline at end of file
+print(f"Total rows: {len(suru_df)}")
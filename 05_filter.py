@@ -1,28 +1,109 @@
+import argparse
+import os
 import pandas as pd
 
-# Read the category Excel file
-df_cat = pd.read_excel('04_cat.xlsx')
+import metrics
+from suru_store import (add_xlsx_argument, combine, export_xlsx, print_incremental, read_previous, read_table,
+                        split_changed, table_path, write_table)
+from word_categories import normalize_key
 
-# Read the Finnish word list
-df_suom_lista = pd.read_csv('kotus uppsl-med-suom-lista.txt', 
-                           header=None, 
-                           names=['word'])
+# Columns needed by the matching step
+COLUMNS = ['suru_id', 'headword', 'Sanaluokka', 'translations', 'content_hash']
 
-# Read the most common searches Excel file
-df_vanligaste = pd.read_excel('kotus Vanligaste sökningarna jan-mars 2025.xlsx',
-                             usecols=['Label', 'Searches'])
+# Word lists to tag the entries with. Each has the column with the word and
+# optionally a rank column (larger is more important) and a weight in the priority score.
+SUBSETS = [
+    {'name': 'suom_lista', 'path': 'kotus uppsl-med-suom-lista.txt', 'key': 'word'},
+    {'name': 'vanligaste', 'path': 'kotus Vanligaste sökningarna jan-mars 2025.xlsx', 'key': 'Label',
+     'rank': 'Searches', 'weight': 2.0},
+]
 
-# Print shapes to verify data was loaded
+def read_subset(subset):
+    """
+    Words of a subset as a Series from normalized key to rank (1 without a rank column).
+    """
+    if subset['path'].endswith('.xlsx'):
+        columns = [subset['key']] + ([subset['rank']] if 'rank' in subset else [])
+        words = pd.read_excel(subset['path'], usecols=columns, dtype={subset['key']: str})
+    else:
+        words = pd.read_csv(subset['path'], header=None, names=[subset['key']], dtype=str, keep_default_na=False)
+    keys = words[subset['key']].map(normalize_key)
+    ranks = words[subset['rank']] if 'rank' in subset else pd.Series(1, index=words.index)
+    # Words without a key would match entries without a headword
+    found = keys.notna() & ranks.notna()
+    return pd.Series(ranks[found].values, index=keys[found].values).groupby(level=0).max()
+
+def tag_subsets(df, subsets):
+    """
+    Tag every row with an in_<name> column per subset, the rank column of
+    ranked subsets and a priority score: the sum over the subsets the row is
+    in of weight, times rank / largest rank for ranked subsets.
+    """
+    keys = df['headword'].map(normalize_key)
+    tagged = df.copy()
+    tagged['priority'] = 0.0
+    for subset in subsets:
+        ranks = read_subset(subset)
+        row_ranks = keys.map(ranks)
+        tagged[f"in_{subset['name']}"] = row_ranks.notna()
+        score = row_ranks.fillna(0)
+        if 'rank' in subset:
+            tagged[subset['rank']] = row_ranks
+            score = score / (ranks.max() or 1)
+        tagged['priority'] += subset.get('weight', 1.0) * score
+        print(f"{subset['name']}: {len(ranks)} words, {int(row_ranks.notna().sum())} rows")
+    return tagged
+
+def select(tagged, names=None, top=None):
+    """
+    Rows in any of the named subsets (all subsets if None), optionally only
+    the top rows by priority.
+    """
+    names = names or [column[3:] for column in tagged.columns if column.startswith('in_')]
+    selected = tagged[tagged[[f'in_{name}' for name in names]].any(axis=1)]
+    if top is not None:
+        selected = selected.sort_values('priority', ascending=False, kind='stable').head(top)
+    return selected
+
+parser = argparse.ArgumentParser(description="Filter the categorised SuRu table to smaller subsets")
+parser.add_argument('--incremental', action='store_true',
+                    help='Only tag entries new or changed since the previous 05_tagged and keep the rest')
+parser.add_argument('--top', type=int, help='Also write 05_top with the N highest priority rows of all subsets')
+add_xlsx_argument(parser)
+args = parser.parse_args()
+metrics.report_at_exit('05_filter')
+
+# Read the category table
+with metrics.stage('read'):
+    df_cat = read_table('04_cat', columns=COLUMNS)
 print("Category dataframe shape:", df_cat.shape)
-print("Finnish word list shape:", df_suom_lista.shape)
-print("Most common searches shape:", df_vanligaste.shape)
-
-#merge df_cat and df_suom_lista on headword and word
-df_merged1 = pd.merge(df_cat, df_suom_lista, left_on='headword', right_on='word', how='inner')
-print(f"suom lista merged shape: {df_merged1.shape}")
-df_merged1.to_excel('05_suom_lista.xlsx', index=False)
-
-#merge df_merged and df_vanligaste on headword and Label
-df_merged2 = pd.merge(df_cat, df_vanligaste, left_on='headword', right_on='Label', how='inner')
-print(f"vanligaste merged shape: {df_merged2.shape}")
-df_merged2.to_excel('05_vanligaste.xlsx', index=False)
\ No newline at end of file
+
+previous = read_previous('05_tagged') if args.incremental else None
+# Previous tags are only valid for the same word lists
+if previous is not None and any(os.path.getmtime(subset['path']) >= os.path.getmtime(table_path('05_tagged'))
+                                for subset in SUBSETS):
+    print("Word lists changed since the previous run, tagging all entries")
+    previous = None
+
+# Tag all rows with their subsets in one pass, then each output is a filter
+if previous is None:
+    with metrics.stage('tag'):
+        tagged = tag_subsets(df_cat, SUBSETS)
+else:
+    todo, kept = split_changed(df_cat, previous, columns=['Sanaluokka'])
+    with metrics.stage('tag'):
+        processed = tag_subsets(todo, SUBSETS)
+    print_incremental(len(kept), len(processed), '05_tagged')
+    tagged = combine(df_cat, kept, processed)
+write_table(tagged, '05_tagged')
+
+outputs = {f"05_{subset['name']}": select(tagged, [subset['name']]) for subset in SUBSETS}
+if args.top:
+    outputs['05_top'] = select(tagged, top=args.top)
+
+for name, df in outputs.items():
+    print(f"{name} shape: {df.shape}")
+    with metrics.stage('write'):
+        write_table(df, name)
+        if args.xlsx:
+            export_xlsx(df, name)
@@ -1,26 +1,192 @@
-import requests
+import argparse
+import asyncio
+import functools
+import json
+import os
 import pandas as pd
-import ast  # Add this import for literal_eval
 
-def save_df_to_xlsx(df, path):
-    # Output the modified dataframe to a new Excel file
-    output_path = path.replace('.xlsx', '_wikidata.xlsx')
-    output_path = path.replace('05', '06')
-    df.to_excel(output_path, index=False)
-    print(f"Output saved to {output_path}")
+import lexeme_index
+import metrics
+import wikidata_api
+from suru_store import add_xlsx_argument, export_xlsx, print_incremental, read_previous, read_table, write_table
 
-def get_lexeme_entity(lexeme_id):
-    url = "https://www.wikidata.org/w/api.php"
-    params = {
-        "action": "wbgetentities",
-        "ids": lexeme_id,
-        "format": "json"
-    }
-    response = requests.get(url, params=params)
-    return response.json()
+# Columns needed from the filtered table
+COLUMNS = ['suru_id', 'headword', 'Sanaluokka', 'translations', 'content_hash']
+RESULT_COLUMNS = ['Lfi_value', 'Lfi_url', 'Lfi_senses', 'p5137', 'p12682', 'Lsv', 'object', 'sv_objects']
+
+# Rows whose candidate lexemes are fetched together with wbgetentities
+WINDOW = 50
+# (lemma, category) pairs per SPARQL query in the sparql backend
+SPARQL_CHUNK = 500
+
+def first_sense_object(entity):
+    """
+    P5137 (item for this sense) of the first sense of a lexeme entity, or ''.
+    """
+    if entity is None:
+        return ''
+    senses = entity.get('senses', [])
+    if len(senses) > 0:
+        objects = senses[0].get('claims', {}).get('P5137')
+        if objects is not None and len(objects) > 0:
+            return objects[0].get('mainsnak').get('datavalue').get('value').get('id')
+    return ''
+
+def sense_ids(entity):
+    """
+    Ids of the senses of a lexeme entity, e.g. ['L123-S1'].
+    """
+    if entity is None:
+        return []
+    return [sense['id'] for sense in entity.get('senses', [])]
+
+def suru_ids(entity):
+    """
+    P12682 (SuRu ID) values of a lexeme entity, joined with ';'.
+    """
+    if entity is None:
+        return ''
+    claims = entity.get('claims', {}).get('P12682', [])
+    return ';'.join(claim['mainsnak']['datavalue']['value'] for claim in claims if 'datavalue' in claim['mainsnak'])
+
+def build_lexeme_query(pairs):
+    """
+    SPARQL query for Finnish lexemes with exactly the given (lemma, category label) pairs.
+    """
+    values = '\n'.join(f"    ({wikidata_api.sparql_literal(lemma, 'fi')} {wikidata_api.sparql_literal(category, 'fi')})"
+                       for lemma, category in pairs)
+    return f"""
+SELECT ?lexeme ?lemma ?categoryLabel ?sense ?item ?suru_id WHERE {{
+  VALUES (?lemma ?categoryLabel) {{
+{values}
+  }}
+  ?lexeme dct:language wd:Q1412 ;
+          wikibase:lemma ?lemma ;
+          wikibase:lexicalCategory ?category .
+  ?category rdfs:label ?categoryLabel .
+  OPTIONAL {{ ?lexeme wdt:P12682 ?suru_id . }}
+  OPTIONAL {{
+    ?lexeme ontolex:sense ?sense .
+    OPTIONAL {{ ?sense wdt:P5137 ?item . }}
+  }}
+}}"""
+
+def entity_number(uri):
+    # Number of a lexeme (.../L123) or sense (.../L123-S2) URI, used for ordering
+    return int(uri.rsplit('-S', 1)[-1].rsplit('/L', 1)[-1]) if uri else 0
+
+def parse_lexeme_bindings(bindings):
+    """
+    Group SPARQL bindings to one match per (lemma, category): the lexeme with the
+    lowest L-id, with its sense ids, P5137 of its first sense and its P12682 values.
+    """
+    lexemes = {}
+    for binding in bindings:
+        key = (binding['lemma']['value'], binding['categoryLabel']['value'])
+        url = binding['lexeme']['value']
+        lexeme = lexemes.get(key)
+        if lexeme is not None and entity_number(lexeme['url']) < entity_number(url):
+            continue
+        if lexeme is None or lexeme['url'] != url:
+            lexeme = lexemes[key] = {'id': url.rsplit('/', 1)[-1], 'word': key[0], 'lang': 'fi', 'category': key[1],
+                                     'url': url, 'senses': {}, 'suru_ids': set(), 'confirmed': True}
+        if 'suru_id' in binding:
+            lexeme['suru_ids'].add(binding['suru_id']['value'])
+        if 'sense' in binding:
+            sense = lexeme['senses'].setdefault(binding['sense']['value'], [])
+            if 'item' in binding:
+                sense.append(binding['item']['value'].rsplit('/', 1)[-1])
+
+    for lexeme in lexemes.values():
+        senses = sorted(lexeme['senses'].items(), key=lambda sense: entity_number(sense[0]))
+        lexeme['senses'] = [uri.rsplit('/', 1)[-1] for uri, _ in senses]
+        lexeme['p5137'] = senses[0][1][0] if senses and senses[0][1] else ''
+        lexeme['p12682'] = ';'.join(sorted(lexeme.pop('suru_ids')))
+    return lexemes
 
-def search_wikidata_objects(query, search_lang, query_lang):
-    base_url = "https://www.wikidata.org/w/api.php"
+def lookup_lexemes_sparql(df):
+    """
+    Find the Finnish lexemes of all (headword, Sanaluokka) pairs in df with
+    SPARQL, SPARQL_CHUNK pairs per query.
+    """
+    pairs = list(dict.fromkeys(
+        (headword, sanaluokka) for headword, sanaluokka in zip(df['headword'], df['Sanaluokka'])
+        if isinstance(headword, str) and isinstance(sanaluokka, str)))
+    lexemes = {}
+    for start in range(0, len(pairs), SPARQL_CHUNK):
+        chunk = pairs[start:start + SPARQL_CHUNK]
+        print(f"SPARQL lookup of {start + len(chunk)} / {len(pairs)} headwords")
+        try:
+            lexemes.update(parse_lexeme_bindings(wikidata_api.sparql_query(build_lexeme_query(chunk))))
+        except wikidata_api.OfflineCacheMiss:
+            # Not recorded in the cache: no lexemes for this chunk
+            pass
+    return lexemes
+
+def lookup_lexemes_index(df, index):
+    """
+    Find candidate Finnish lexemes of all (headword, Sanaluokka) pairs in df in
+    the local lexeme index. The candidates are confirmed online in resolve_p5137.
+    """
+    lexemes = {}
+    for headword, sanaluokka in zip(df['headword'], df['Sanaluokka']):
+        category = lexeme_index.LEXICAL_CATEGORIES.get(sanaluokka)
+        if not isinstance(headword, str) or category is None or (headword, sanaluokka) in lexemes:
+            continue
+        candidates = index.lookup(headword, 'fi', category)
+        if candidates:
+            lexeme_id = candidates[0]['id']
+            lexemes[(headword, sanaluokka)] = {'id': lexeme_id, 'word': headword, 'lang': 'fi', 'category': sanaluokka,
+                                               'url': f"http://www.wikidata.org/entity/{lexeme_id}"}
+    print(f"Found {len(lexemes)} headwords in the lexeme index")
+    return lexemes
+
+class LookupMemo:
+    """
+    Results of wbsearchentities lookups for the whole run, keyed by the lookup
+    and its arguments (term, languages, type). Identical lookups in flight are
+    coalesced into one request.
+    """
+    def __init__(self):
+        self._results = {}
+        self._pending = {}
+        self.calls = 0
+        self.repeated = 0
+        self.coalesced = 0
+
+    async def get(self, key, lookup):
+        self.calls += 1
+        if key in self._results:
+            self.repeated += 1
+            metrics.inc('lookup_memo', result='hit')
+            return dict(self._results[key])
+        if key in self._pending:
+            self.coalesced += 1
+            metrics.inc('lookup_memo', result='coalesced')
+            return dict(await self._pending[key])
+        metrics.inc('lookup_memo', result='miss')
+        task = self._pending[key] = asyncio.ensure_future(lookup())
+        try:
+            self._results[key] = await task
+        finally:
+            del self._pending[key]
+        return dict(self._results[key])
+
+    def print_stats(self):
+        saved = self.repeated + self.coalesced
+        print(f"Lookups: {self.calls}, network calls saved: {saved} "
+              f"({self.repeated} repeated, {self.coalesced} coalesced in flight)")
+
+memo = LookupMemo()
+
+def memoized(func):
+    @functools.wraps(func)
+    async def wrapper(*args):
+        return await memo.get((func.__name__, *args), lambda: func(*args))
+    return wrapper
+
+@memoized
+async def search_wikidata_objects(query, search_lang, query_lang):
     params = {
         "action": "wbsearchentities",
         "search": query,
@@ -29,9 +195,11 @@ def search_wikidata_objects(query, search_lang, query_lang):
         "uselang": query_lang, # language of the query
         "type": "item",
     }
-    response = requests.get(base_url, params=params)
-    data = response.json()
-    
+    try:
+        data = await wikidata_api.get_json_async(params)
+    except wikidata_api.OfflineCacheMiss:
+        data = {}
+
     # Check if 'search' key exists in response and has results
     if 'search' in data and len(data['search']) > 0:
         first_result = data['search'][0]
@@ -41,8 +209,8 @@ def search_wikidata_objects(query, search_lang, query_lang):
         }
     return {'q_code': '', 'title': ''}
 
-def search_wikidata_lexemes(query, search_category, search_lang, query_lang):
-    base_url = "https://www.wikidata.org/w/api.php"
+@memoized
+async def search_wikidata_lexemes(query, search_category, search_lang, query_lang):
     params = {
         "action": "wbsearchentities",
         "search": query,
@@ -51,100 +219,251 @@ def search_wikidata_lexemes(query, search_category, search_lang, query_lang):
         "uselang": query_lang, # language of the query
         "type": "lexeme",
     }
-    response = requests.get(base_url, params=params)
-    data = response.json()
-    
+    try:
+        data = await wikidata_api.get_json_async(params)
+    except wikidata_api.OfflineCacheMiss:
+        return {}
+
     # Check if 'search' key exists in response
     if 'search' not in data:
         print(f"Warning: No 'search' key in response for query: {query}")
         return {}
  
+    # The entity (for P5137) is fetched later in a batch, see resolve_p5137
     if len(data['search']) > 0:
         for item in data['search']:
             #print(item)
-            id = item['id']
-            entity = get_lexeme_entity(id)
-            entities = entity.get('entities')
-            if entities is not None:
-                senses = entities[id].get('senses', [])
-                if len(senses) > 0:
-                    objects = senses[0].get('claims').get('P5137')
-                    if objects is not None and len(objects) > 0:    
-                        object = objects[0].get('mainsnak').get('datavalue').get('value').get('id')
-                    else:
-                        object = ''
-                else:
-                    object = ''
-            else:
-                object = ''
             word = item['display']['label']['value']
             lang = item['display']['label']['language']
             category = item['display']['description']['value'].split(", ")[1]
             url = item['concepturi']
             if lang == search_lang and word == query and category == search_category:
-                item = {'word': word, 'lang': lang, 'category': category, 'url': url, 'p5137': object}
+                item = {'id': item['id'], 'word': word, 'lang': lang, 'category': category, 'url': url}
                 return item
     return {}
 
-def add_wikidata_to_suru(df):
-    # Initialize new columns with empty strings
-    df['Lfi_value'] = ''
-    df['Lfi_url'] = ''
-    df['Lsv'] = ''
-    df['p5137'] = ''
-    # Iterate through each row in the dataframe
-    i = 0
-    # start from row 2309
-    for index, row in df.iterrows():
-        i = i + 1
-        headword = row['headword']
-        sanaluokka = row['Sanaluokka']
-        print(f"{i} / {len(df)} Fetching L code for headword: {headword}")
-        item = search_wikidata_lexemes(headword, sanaluokka, "fi", "fi")
-        object = search_wikidata_objects(headword, "fi", "fi")
-        print(f"{i} / {len(df)} {index} {headword} {sanaluokka} {item} {object}")
-        df.at[index, 'Lfi_value'] = item.get('word', '')
-        df.at[index, 'Lfi_url'] = item.get('url', '')
-        df.at[index, 'p5137'] = item.get('p5137', '')
-
-        translation_list_sv = row['translations']
-        # Skip if translation_list_sv is NaN or None
-        if pd.isna(translation_list_sv):
-            df.at[index, 'Lsv'] = str([])
-            continue
-            
-        # Handle case where translation_list_sv is a string
-        if isinstance(translation_list_sv, str):
-            # Split by semicolon and strip whitespace
-            translations = [t.strip() for t in translation_list_sv.split(';')]
-        else:
-            translations = translation_list_sv
-        Lsv_list = []
-        sv_objects = []
-        for translation in translations:
-            print(f"{index} sv söker: {translation} {sanaluokka}")
-            item = search_wikidata_objects(translation, "sv", "fi")
-            object = search_wikidata_objects(translation, "sv", "fi")
-            if item.get('word', '') != '':
-                Lsv_list.append([item.get('word', ''), item.get('url', ''), item.get('p5137', '')])
-            if object.get('q_code', '') != '':
-                sv_objects.append([object.get('q_code', ''), object.get('title', '')])
-        print(f"{index} Lsv hittade: {str(Lsv_list)}")
-        print(f"{index} sv_objects: {str(sv_objects)}")
-        df.at[index, 'Lsv'] = str(Lsv_list)
-
-        df.at[index, 'object'] = object.get('q_code', '')+';'+object.get('title', '')
-        df.at[index, 'sv_objects'] = str(sv_objects)
-        # every 50 rows, save the dataframe to a xlsx
-        if index % 50 == 0:
-            save_df_to_xlsx(df, "suru_temp.xlsx")
-    return df
-
-#input_file_path = '04_cat.xlsx'
-# input_file_path = '05_suom_lista.xlsx'
-input_file_path = '05_vanligaste.xlsx'
-
-suru_df = pd.read_excel(input_file_path)
-print(suru_df.shape)
-suru_df = add_wikidata_to_suru(suru_df)
-save_df_to_xlsx(suru_df, input_file_path)
\ No newline at end of file
+async def match_translation(index, translation, sanaluokka):
+    """
+    Item search for a Swedish translation. The one result is checked for
+    both the Lsv and the sv_objects column.
+    """
+    print(f"{index} sv söker: {translation} {sanaluokka}")
+    sv_object = await search_wikidata_objects(translation, "sv", "fi")
+    return sv_object, sv_object
+
+async def lookup_lexeme(headword, sanaluokka, lexemes):
+    return lexemes.get((headword, sanaluokka), {})
+
+async def match_row(i, total, index, row, lexemes=None):
+    """
+    Match the headword and the Swedish translations of one row.
+    The lookups of the row run concurrently. Returns the new column values for the row.
+    lexemes holds Finnish lexemes already found with lookup_lexemes_sparql or
+    lookup_lexemes_index; without it the headword is matched with wbsearchentities.
+    """
+    headword = row['headword']
+    sanaluokka = row['Sanaluokka']
+    print(f"{i} / {total} Fetching L code for headword: {headword}")
+    translations = [t.strip() for t in row['translations'] or []]
+    if lexemes is None:
+        fi_lexeme = search_wikidata_lexemes(headword, sanaluokka, "fi", "fi")
+    else:
+        fi_lexeme = lookup_lexeme(headword, sanaluokka, lexemes)
+    item, fi_object, *sv_results = await asyncio.gather(
+        fi_lexeme,
+        search_wikidata_objects(headword, "fi", "fi"),
+        *(match_translation(index, translation, sanaluokka) for translation in translations))
+    print(f"{i} / {total} {index} {headword} {sanaluokka} {item} {fi_object}")
+    result = {
+        # Lexemes not confirmed by SPARQL are completed in resolve_p5137
+        'Lfi_id': '' if item.get('confirmed') else item.get('id', ''),
+        'Lfi_value': item.get('word', ''),
+        'Lfi_url': item.get('url', ''),
+        'Lfi_senses': item.get('senses', []),
+        'p5137': item.get('p5137', ''),
+        'p12682': item.get('p12682', ''),
+        'Lsv': [],
+        'object': fi_object.get('q_code', '')+';'+fi_object.get('title', ''),
+        'sv_objects': [],
+    }
+
+    for item, sv_object in sv_results:
+        if item.get('word', '') != '':
+            result['Lsv'].append({'word': item.get('word', ''), 'url': item.get('url', ''), 'p5137': item.get('p5137', '')})
+        if sv_object.get('q_code', '') != '':
+            result['sv_objects'].append({'q_code': sv_object.get('q_code', ''), 'title': sv_object.get('title', '')})
+    print(f"{index} Lsv hittade: {str(result['Lsv'])}")
+    print(f"{index} sv_objects: {str(result['sv_objects'])}")
+    return result
+
+def resolve_p5137(results):
+    """
+    Fill in the senses, p5137 and p12682 for a window of matched rows. The candidate lexemes of all
+    rows are fetched with wbgetentities, up to 50 ids per request. Candidates that
+    no longer exist are dropped.
+    """
+    try:
+        entities = wikidata_api.get_entities([result['Lfi_id'] for result in results if result['Lfi_id']])
+    except wikidata_api.OfflineCacheMiss:
+        # Candidates that cannot be checked offline are dropped like missing ones
+        entities = {}
+    for result in results:
+        lexeme_id = result.pop('Lfi_id')
+        if lexeme_id and lexeme_id not in entities:
+            result['Lfi_value'] = ''
+            result['Lfi_url'] = ''
+        elif lexeme_id:
+            result['Lfi_senses'] = sense_ids(entities.get(lexeme_id))
+            result['p5137'] = first_sense_object(entities.get(lexeme_id))
+            result['p12682'] = suru_ids(entities.get(lexeme_id))
+
+def row_key(row):
+    """
+    Key of a row in the progress journal.
+    """
+    sanaluokka = row['Sanaluokka'] if isinstance(row['Sanaluokka'], str) else ''
+    return f"{row['suru_id']}|{sanaluokka}"
+
+def repair_journal(journal_path):
+    """
+    Cut off a last line left incomplete by a crash, so new records start on a line of their own.
+    """
+    if not os.path.exists(journal_path):
+        return
+    with open(journal_path, 'rb+') as f:
+        data = f.read()
+        if data and not data.endswith(b'\n'):
+            print("Dropping incomplete last line of the progress journal")
+            f.truncate(data.rfind(b'\n') + 1)
+
+def read_journal(journal_path):
+    """
+    Results of completed rows from the progress journal, by row key, with the
+    content_hash of the entry they were matched for. Later lines win.
+    """
+    results = {}
+    if not os.path.exists(journal_path):
+        return results
+    with open(journal_path, encoding='utf-8') as f:
+        for line in f:
+            record = json.loads(line)
+            results[record.pop('key')] = record
+    return results
+
+def append_journal(journal, keys, hashes, results):
+    for key, content_hash, result in zip(keys, hashes, results):
+        journal.write(json.dumps({'key': key, 'content_hash': content_hash, **result}, ensure_ascii=False) + '\n')
+    journal.flush()
+    os.fsync(journal.fileno())
+
+def is_done(done, key, content_hash):
+    # Results for an older version of the entry, or from journals without content_hash, are matched again
+    return key in done and done[key].get('content_hash') == content_hash
+
+def seed_journal(journal_path, df, previous, previous_name):
+    """
+    Add the results in previous of the rows of df whose entry has not changed
+    to the journal of an incremental run, so only the others are matched.
+    Rows the journal already has for the current entry are kept, so an
+    interrupted incremental run continues where it stopped.
+    """
+    repair_journal(journal_path)
+    done = read_journal(journal_path)
+    current = set(zip((row_key(row) for _, row in df.iterrows()), df['content_hash']))
+    kept = [(row_key(row), row) for _, row in previous.iterrows()
+            if (row_key(row), row['content_hash']) in current and not is_done(done, row_key(row), row['content_hash'])]
+    with open(journal_path, 'a', encoding='utf-8') as journal:
+        append_journal(journal, [key for key, _ in kept], [row['content_hash'] for _, row in kept],
+                       [{column: row.get(column) for column in RESULT_COLUMNS} for _, row in kept])
+    resumed = sum(is_done(done, key, content_hash) for key, content_hash in current)
+    print_incremental(len(kept), len(df) - len(kept) - resumed, previous_name)
+    if resumed:
+        print(f"{resumed} rows already in {journal_path}")
+
+async def match_rows(df, journal_path, lexemes=None):
+    """
+    Match all rows, a window of WINDOW rows at a time. Rows of a window are
+    matched concurrently; the number of requests in flight is bounded by the
+    wikidata_api worker pool and rate limiter. Each completed window is
+    appended to the progress journal.
+    """
+    loop = asyncio.get_running_loop()
+    with open(journal_path, 'a', encoding='utf-8') as journal:
+        for start in range(0, len(df), WINDOW):
+            window_df = df.iloc[start:start + WINDOW]
+            window = await asyncio.gather(*(
+                match_row(start + n, len(df), index, row, lexemes)
+                for n, (index, row) in enumerate(window_df.iterrows(), start=1)))
+            await loop.run_in_executor(wikidata_api.executor, resolve_p5137, window)
+            append_journal(journal, [row_key(row) for _, row in window_df.iterrows()], window_df['content_hash'], window)
+    memo.print_stats()
+
+def add_wikidata_to_suru(df, journal_path, resume=False, backend='api', index_path=lexeme_index.DEFAULT_PATH):
+    """
+    Match the rows of df that are not in the progress journal yet, then
+    assemble the result columns of all rows from the journal.
+    Without resume the journal is started over.
+    """
+    if not resume and os.path.exists(journal_path):
+        os.remove(journal_path)
+    repair_journal(journal_path)
+    done = read_journal(journal_path)
+    keys = [row_key(row) for _, row in df.iterrows()]
+    todo_df = df[[not is_done(done, key, content_hash) for key, content_hash in zip(keys, df['content_hash'])]]
+    todo_df = todo_df.drop_duplicates(subset=['suru_id', 'Sanaluokka'])
+    print(f"{len(df) - len(todo_df)} rows already matched, {len(todo_df)} to match")
+
+    lexemes = None
+    with metrics.stage('lookup lexemes'):
+        if backend == 'sparql':
+            lexemes = lookup_lexemes_sparql(todo_df)
+        elif backend == 'index':
+            index = lexeme_index.open_index(index_path)
+            if index is None:
+                raise FileNotFoundError(f"Lexeme index not found: {index_path}, build it with lexeme_index.py")
+            lexemes = lookup_lexemes_index(todo_df, index)
+    with metrics.stage('match rows'):
+        asyncio.run(match_rows(todo_df, journal_path, lexemes))
+
+    results = read_journal(journal_path)
+    return df.assign(**pd.DataFrame([results[key] for key in keys], index=df.index, columns=RESULT_COLUMNS))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Match SuRu headwords and translations to Wikidata lexemes")
+    parser.add_argument('--input', default='05_vanligaste',
+                        help='Input table, e.g. 04_cat, 05_suom_lista or 05_vanligaste (default: 05_vanligaste)')
+    parser.add_argument('--backend', choices=['api', 'sparql', 'index'], default='api',
+                        help='Match Finnish headwords with wbsearchentities (api), exact SPARQL lookups (sparql) '
+                             'or the local lexeme index, confirmed online (index)')
+    parser.add_argument('--lexeme-index', default=lexeme_index.DEFAULT_PATH,
+                        help=f'Lexeme index for --backend index (default: {lexeme_index.DEFAULT_PATH})')
+    parser.add_argument('--resume', action='store_true',
+                        help='Continue an interrupted run, skipping rows already in the progress journal')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Only match rows of entries new or changed since the previous output and keep the rest')
+    add_xlsx_argument(parser)
+    wikidata_api.add_api_arguments(parser)
+    args = parser.parse_args()
+    wikidata_api.configure_from_args(args)
+
+    output_name = args.input.replace('05', '06').replace('04', '06')
+    metrics.report_at_exit(output_name)
+
+    with metrics.stage('read'):
+        suru_df = read_table(args.input, columns=COLUMNS)
+    # Sanaluokka is a list of categories; a lexeme is matched per category
+    suru_df = suru_df.explode('Sanaluokka', ignore_index=True)
+    print(suru_df.shape)
+    journal_path = f"{output_name}.journal.jsonl"
+    resume = args.resume
+    previous = read_previous(output_name) if args.incremental else None
+    if previous is not None:
+        seed_journal(journal_path, suru_df, previous, output_name)
+        resume = True
+    suru_df = add_wikidata_to_suru(suru_df, journal_path, resume, args.backend, args.lexeme_index)
+    with metrics.stage('write'):
+        write_table(suru_df, output_name)
+        if args.xlsx:
+            export_xlsx(suru_df, output_name)
+    wikidata_api.print_stats()
+    wikidata_api.close()
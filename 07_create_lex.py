@@ -1,5 +1,4 @@
 import logging
-import pandas as pd
 import json
 import uuid
 import os
@@ -10,34 +9,187 @@ from LexData.language import en
 from LexData.claim import Claim
 fi = LexData.Language("fi", "Q1412")
 import requests
+import threading
+from requests.adapters import HTTPAdapter
 
-# Load environment variables from .env file
-load_dotenv()
+import lexeme_index
+import metrics
 
 logging.basicConfig(level=logging.INFO)
 
-# Get credentials from environment variables
-wiki_username = os.getenv("WIKI_USERNAME")
-wiki_password = os.getenv("WIKI_PASSWORD")
-wiki_email = os.getenv("WIKI_EMAIL")
-quickstatement_token = os.getenv("QUICKSTATEMENT_TOKEN")
+def credentials():
+    """
+    Wikidata username, password and email from the environment or the .env file.
+    """
+    load_dotenv()
+    wiki_username = os.getenv("WIKI_USERNAME")
+    wiki_password = os.getenv("WIKI_PASSWORD")
+    wiki_email = os.getenv("WIKI_EMAIL")
+    if not wiki_username or not wiki_password:
+        raise ValueError("WIKI_USERNAME and WIKI_PASSWORD must be set in .env file")
+    return wiki_username, wiki_password, wiki_email
 
-if not wiki_username or not wiki_password:
-    raise ValueError("WIKI_USERNAME and WIKI_PASSWORD must be set in .env file")
+class WikidataWriteSession:
+    """
+    Long-lived logged-in session for Wikidata API writes. Logs in on the first
+    write, caches the CSRF token and only fetches a new one on badtoken errors.
+    Thread-safe, so add() calls from the Flask server can share it.
+    """
+    api_url = "https://www.wikidata.org/w/api.php"
+
+    def __init__(self, username, password, email):
+        self.username = username
+        self.password = password
+        self.session = requests.Session()
+        self.session.headers.update({
+            'User-Agent': f'SuruWikidataBot/1.0 (https://github.com/robertsilen/suru-wikidata; {email})'
+        })
+        # Keep-alive connections, reused across writes
+        self.session.mount('https://', HTTPAdapter(pool_maxsize=8))
+        self.csrf_token = None
+        self._lock = threading.Lock()
+
+    def get_token(self, token_type):
+        response = self.session.get(self.api_url, params={
+            'action': 'query',
+            'meta': 'tokens',
+            'type': token_type,
+            'format': 'json'
+        })
+        response.raise_for_status()
+        return response.json()['query']['tokens'][f'{token_type}token']
+
+    def login(self):
+        login_token = self.get_token('login')
+        response = self.session.post(self.api_url, data={
+            'action': 'login',
+            'lgname': self.username,
+            'lgpassword': self.password,
+            'lgtoken': login_token,
+            'format': 'json'
+        })
+        response.raise_for_status()
+        login_result = response.json()
+        if login_result.get('login', {}).get('result') != 'Success':
+            raise RuntimeError(f"Login failed: {login_result}")
+        print("Successfully logged in to Wikidata")
+        self.csrf_token = self.get_token('csrf')
+
+    def refresh_token(self):
+        self.csrf_token = self.get_token('csrf')
+        # An anonymous token means the login session has expired
+        if self.csrf_token == '+\\':
+            self.login()
+
+    def ensure_login(self):
+        """
+        Log in unless already logged in. Returns the CSRF token.
+        """
+        with self._lock:
+            if self.csrf_token is None:
+                with metrics.timer('login', client='write_session'):
+                    self.login()
+            return self.csrf_token
+
+    def post(self, data):
+        """
+        POST an edit with the cached CSRF token. On badtoken the token is
+        refreshed (logging in again if needed) and the edit retried once.
+        """
+        token = self.ensure_login()
+        result = self._post(data, token)
+        if result.get('error', {}).get('code') == 'badtoken':
+            metrics.inc('http_retries', endpoint=data.get('action'), reason='badtoken')
+            with self._lock:
+                if self.csrf_token == token:
+                    self.refresh_token()
+                token = self.csrf_token
+            result = self._post(data, token)
+        return result
+
+    def _post(self, data, token):
+        with metrics.timer('http_request', endpoint=data.get('action')):
+            response = self.session.post(self.api_url, data={**data, 'token': token, 'format': 'json'})
+        metrics.inc('http_requests', endpoint=data.get('action'), status=response.status_code)
+        response.raise_for_status()
+        return response.json()
+
+# Sessions are created on first use, so importing this module needs no credentials or network
+_sessions_lock = threading.Lock()
+_repo = None
+_write_session = None
+
+def get_repo():
+    """
+    The LexData session, logged in on the first call.
+    """
+    global _repo
+    with _sessions_lock:
+        if _repo is None:
+            wiki_username, wiki_password, _ = credentials()
+            with metrics.timer('login', client='lexdata'):
+                _repo = LexData.WikidataSession(wiki_username, wiki_password)
+        return _repo
+
+def get_write_session():
+    """
+    The shared WikidataWriteSession. It logs in on its first write.
+    """
+    global _write_session
+    with _sessions_lock:
+        if _write_session is None:
+            _write_session = WikidataWriteSession(*credentials())
+        return _write_session
+
+def warm_up():
+    """
+    Log in both sessions now instead of on the first edit.
+    """
+    get_repo()
+    get_write_session().ensure_login()
 
-repo = LexData.WikidataSession(wiki_username, wiki_password)
 categories = {
     "noun": "Q1084",
     "adjective": "Q34698",
 }
 
+# Local lexeme index (see lexeme_index.py), None if it has not been built
+index = lexeme_index.open_index()
+
+def find_or_create_lexeme(lemma, category_id):
+    """
+    Look the lexeme up in the local index first and only load that lexeme online.
+    Falls back to LexData's search-or-create.
+    """
+    if index is not None:
+        candidates = index.lookup(lemma, fi.short, category_id)
+        if candidates:
+            try:
+                return LexData.Lexeme(get_repo(), candidates[0]['id'])
+            except Exception as e:
+                print(f"Could not load {candidates[0]['id']} from the lexeme index: {e}")
+    return LexData.get_or_create_lexeme(get_repo(), lemma, fi, category_id)
+
+# One lock per lexeme, so concurrent add() calls for the same lemma do not both create it
+_lexeme_locks = {}
+_lexeme_locks_lock = threading.Lock()
+
+def lexeme_lock(lang, lemma, category):
+    with _lexeme_locks_lock:
+        return _lexeme_locks.setdefault((lang, lemma, category), threading.Lock())
+
 def add(lang, lemma, category, suru_id, sv_gloss, betydelse_objekt):
+    with lexeme_lock(lang, lemma, category):
+        return _add(lang, lemma, category, suru_id, sv_gloss, betydelse_objekt)
+
+def _add(lang, lemma, category, suru_id, sv_gloss, betydelse_objekt):
     category_id = categories.get(category, None)
     if category_id is None:
         raise ValueError(f"Unknown category for {lang} {lemma}: {category}")
 
     # Find or create lexeme
-    L2 = LexData.get_or_create_lexeme(repo, lemma, fi, category_id)
+    with metrics.timer('lexdata', operation='find_or_create_lexeme'):
+        L2 = find_or_create_lexeme(lemma, category_id)
     lexeme_id = L2['id']
     print(f"Created lexeme for {lang}:{lemma}, {category}, URL: https://www.wikidata.org/wiki/Lexeme:{lexeme_id}")
 
@@ -45,100 +197,31 @@ def add(lang, lemma, category, suru_id, sv_gloss, betydelse_objekt):
     if suru_id is not None:
         suru_property = "P12682"
         suru_value = suru_id.replace("SURU_", "")    
-        
-        # Use Wikidata API directly with proper authentication
-        api_url = "https://www.wikidata.org/w/api.php"
-        
-        # Create session and authenticate
-        session = requests.Session()
-        session.headers.update({
-            'User-Agent': f'SuruWikidataBot/1.0 (https://github.com/robertsilen/suru-wikidata; {wiki_email})'
-        })
-        
-        # Step 1: Get login token
-        login_token_params = {
-            'action': 'query',
-            'meta': 'tokens',
-            'type': 'login',
-            'format': 'json'
-        }
-        
-        login_token_response = session.get(api_url, params=login_token_params)
-        if login_token_response.status_code != 200:
-            print(f"Failed to get login token. Status: {login_token_response.status_code}")
-            return None
-            
-        login_token_data = login_token_response.json()
-        login_token = login_token_data['query']['tokens']['logintoken']
-        print(f"Got login token: {login_token}")
-        
-        # Step 2: Perform login
-        login_data = {
-            'action': 'login',
-            'lgname': wiki_username,
-            'lgpassword': wiki_password,
-            'lgtoken': login_token,
-            'format': 'json'
-        }
-        
-        login_response = session.post(api_url, data=login_data)
-        if login_response.status_code != 200:
-            print(f"Failed to login. Status: {login_response.status_code}")
-            return None
-            
-        login_result = login_response.json()
-        if login_result.get('login', {}).get('result') != 'Success':
-            print(f"Login failed: {login_result}")
-            return None
-            
-        print("Successfully logged in to Wikidata")
-        
-        # Step 3: Get CSRF token for editing
-        csrf_token_params = {
-            'action': 'query',
-            'meta': 'tokens',
-            'type': 'csrf',
-            'format': 'json'
-        }
-        
-        csrf_response = session.get(api_url, params=csrf_token_params)
-        if csrf_response.status_code == 200:
-            csrf_data = csrf_response.json()
-            csrf_token = csrf_data['query']['tokens']['csrftoken']
-            print(f"Got CSRF token: {csrf_token}")
-            
-            # Step 4: Add the claim
-            claim_data = {
+        # A job requeued after a restart may already have added the claim
+        existing = [claim['mainsnak']['datavalue']['value'] for claim in L2.get('claims', {}).get(suru_property, [])
+                    if 'datavalue' in claim['mainsnak']]
+        if suru_value in existing:
+            print(f"Lexeme {lexeme_id} already has Suru_ID (P12682) claim with value '{suru_value}'")
+        else:
+            result = get_write_session().post({
                 'action': 'wbcreateclaim',
                 'entity': lexeme_id,
                 'snaktype': 'value',
                 'property': suru_property,
                 'value': json.dumps(suru_value),
-                'token': csrf_token,
-                'format': 'json'
-            }
-            
-            print(f"Adding claim with data: {claim_data}")
-            
-            claim_response = session.post(api_url, data=claim_data)
-            if claim_response.status_code == 200:
-                result = claim_response.json()
-                if 'success' in result:
-                    print(f"Successfully added Suru_ID (P12682) claim with value '{suru_value}' to lexeme {lexeme_id}")
-                else:
-                    print(f"Failed to add claim. Response: {result}")
+            })
+            if 'success' in result:
+                print(f"Successfully added Suru_ID (P12682) claim with value '{suru_value}' to lexeme {lexeme_id}")
             else:
-                print(f"Failed to add claim. Status: {claim_response.status_code}, Response: {claim_response.text}")
-        else:
-            print(f"Failed to get CSRF token. Status: {csrf_response.status_code}, Response: {csrf_response.text}")
-    
+                print(f"Failed to add claim. Response: {result}")
 
     # Add sense to lexeme
     if len(L2.senses) == 0 and sv_gloss is not None and betydelse_objekt is not None:
-        L2.createSense(
-            {"sv": sv_gloss},
-            claims={"P5137": [betydelse_objekt]},
-        )
+        with metrics.timer('lexdata', operation='create_sense'):
+            L2.createSense(
+                {"sv": sv_gloss},
+                claims={"P5137": [betydelse_objekt]},
+            )
         print(f"Added sense for {lang}:{lemma}, {category}, URL: https://www.wikidata.org/wiki/Lexeme:{lexeme_id}")
     else:
         print(f"Did not add sense for {lang}:{lemma}, {category}, URL: https://www.wikidata.org/wiki/Lexeme:{lexeme_id}")
@@ -0,0 +1,298 @@
+import argparse
+import importlib.util
+import json
+import re
+import sys
+import time
+
+import pandas as pd
+
+import lexeme_index
+import metrics
+import wikidata_api
+from suru_store import read_table, table_columns
+
+COLUMNS = ['suru_id', 'headword', 'Sanaluokka', 'translations', 'Lfi_url', 'object']
+# Senses and SuRu IDs of the matched lexemes, missing in 06 outputs of older versions
+MATCH_COLUMNS = ['Lfi_senses', 'p12682']
+
+# (lemma, lexical category) pairs per SPARQL query when looking for existing lexemes
+SPARQL_CHUNK = 200
+
+def item_statement(prop, item_id):
+    return {
+        'mainsnak': {
+            'snaktype': 'value',
+            'property': prop,
+            'datavalue': {
+                'value': {'entity-type': 'item', 'numeric-id': int(item_id[1:]), 'id': item_id},
+                'type': 'wikibase-entityid'
+            }
+        },
+        'type': 'statement',
+        'rank': 'normal'
+    }
+
+def string_statement(prop, value):
+    return {
+        'mainsnak': {
+            'snaktype': 'value',
+            'property': prop,
+            'datavalue': {'value': value, 'type': 'string'}
+        },
+        'type': 'statement',
+        'rank': 'normal'
+    }
+
+def new_sense(sv_gloss, item_id):
+    return {
+        'add': '',
+        'glosses': {'sv': {'language': 'sv', 'value': sv_gloss}},
+        'claims': [item_statement('P5137', item_id)]
+    }
+
+def read_confirmed_senses(path):
+    """
+    Senses checked by a person, from a CSV or xlsx file with the columns suru_id,
+    sv_gloss and p5137. Returns a dict from SuRu ID to (gloss, P5137 item).
+    """
+    senses = pd.read_excel(path, dtype=str) if path.endswith('.xlsx') else pd.read_csv(path, dtype=str)
+    confirmed = {}
+    for suru_id, gloss, item in zip(senses['suru_id'], senses['sv_gloss'], senses['p5137']):
+        if isinstance(gloss, str) and gloss.strip() and isinstance(item, str) and re.fullmatch(r'Q\d+', item.strip()):
+            confirmed[suru_id] = (gloss.strip(), item.strip())
+        else:
+            print(f"Ignoring confirmed sense of {suru_id}: needs a gloss and a Q item, got {gloss!r}, {item!r}")
+    return confirmed
+
+def row_values(row, confirmed_senses):
+    """
+    Values of a matched row needed for the edits: existing lexeme id with the
+    senses and SuRu IDs 06 found on it (None if unknown), lexical category,
+    SuRu ID without prefix, and the Swedish gloss and item of the sense if
+    confirmed. The unconfirmed candidates of 06 (first translation, top item
+    search hit) are kept for the report.
+    """
+    lexeme_id = row['Lfi_url'].rsplit('/', 1)[-1] if row['Lfi_url'] else ''
+    # Missing values are NaN in the table but must be null in the JSON report
+    lemma = row['headword'] if isinstance(row['headword'], str) else None
+    category = row['Sanaluokka'] if isinstance(row['Sanaluokka'], str) else None
+    known = bool(lexeme_id) and isinstance(row.get('Lfi_senses'), list) and isinstance(row.get('p12682'), str)
+    translations = row['translations'] if row['translations'] is not None else []
+    sv_gloss, sense_item = confirmed_senses.get(row['suru_id'], (None, None))
+    return {
+        'lexeme_id': lexeme_id,
+        'senses': row['Lfi_senses'] if known else None,
+        'existing_suru_ids': [value for value in row['p12682'].split(';') if value] if known else None,
+        'lemma': lemma,
+        'category': category,
+        'category_id': lexeme_index.LEXICAL_CATEGORIES.get(category),
+        'suru_value': row['suru_id'].replace('SURU_', ''),
+        'sv_gloss': sv_gloss,
+        'sense_item': sense_item,
+        'candidate_gloss': translations[0].strip() if len(translations) else None,
+        'candidate_item': row['object'].split(';')[0] if row['object'] else None,
+    }
+
+def existing_lexemes_query(pairs):
+    """
+    SPARQL query for Finnish lexemes with exactly the given (lemma, lexical category item) pairs.
+    """
+    values = '\n'.join(f"    ({wikidata_api.sparql_literal(lemma, 'fi')} wd:{category_id})" for lemma, category_id in pairs)
+    return f"""
+SELECT ?lexeme ?lemma ?category WHERE {{
+  VALUES (?lemma ?category) {{
+{values}
+  }}
+  ?lexeme dct:language wd:Q1412 ;
+          wikibase:lemma ?lemma ;
+          wikibase:lexicalCategory ?category .
+}}"""
+
+def existing_lexemes(pairs):
+    """
+    L-ids of the Finnish lexemes that already exist for each (lemma, category item)
+    pair, in L-id order. Uses the local lexeme index when built, else SPARQL.
+    """
+    pairs = list(dict.fromkeys(pairs))
+    index = lexeme_index.open_index()
+    if index is not None:
+        return {(lemma, category_id): [lexeme['id'] for lexeme in index.lookup(lemma, 'fi', category_id)]
+                for lemma, category_id in pairs}
+    found = {pair: [] for pair in pairs}
+    for start in range(0, len(pairs), SPARQL_CHUNK):
+        for binding in wikidata_api.sparql_query(existing_lexemes_query(pairs[start:start + SPARQL_CHUNK])):
+            pair = (binding['lemma']['value'], binding['category']['value'].rsplit('/', 1)[-1])
+            found.setdefault(pair, []).append(binding['lexeme']['value'].rsplit('/', 1)[-1])
+    return {pair: sorted(set(ids), key=lambda lexeme_id: int(lexeme_id[1:])) for pair, ids in found.items()}
+
+def plan_edits(df, confirmed_senses=None):
+    """
+    Plan one wbeditentity call per lexeme. Rows without a matched lexeme use
+    the existing lexeme with the same lemma and category, and are skipped if
+    there are several; only if there is none a new lexeme is planned. SuRu IDs
+    and senses the lexemes already have are left out: they come from the 06
+    output, and lexemes it has no senses for are fetched in batches. Rows for
+    the same lexeme are combined into one edit.
+    Senses are only added from confirmed_senses (see read_confirmed_senses);
+    rows of lexemes without senses that have none confirmed are returned as
+    the third value.
+    """
+    candidates = [row_values(row, confirmed_senses or {}) for _, row in df.iterrows()]
+    unmatched = [row for row in candidates
+                 if not row['lexeme_id'] and row['category_id'] is not None and isinstance(row['lemma'], str)]
+    existing = existing_lexemes((row['lemma'], row['category_id']) for row in unmatched)
+
+    rows = []
+    skipped = []
+    for row in candidates:
+        lexeme_ids = existing.get((row['lemma'], row['category_id']), []) if not row['lexeme_id'] else []
+        if len(lexeme_ids) > 1:
+            skipped.append({**row, 'reason': f"ambiguous, existing lexemes {', '.join(lexeme_ids)}"})
+            continue
+        if lexeme_ids:
+            row['lexeme_id'] = lexeme_ids[0]
+        rows.append(row)
+    print(f"{len(unmatched)} rows without a matched lexeme, "
+          f"{sum(len(ids) == 1 for ids in existing.values())} of their lemmas already have one")
+    # Senses and SuRu IDs by lexeme id
+    known = {}
+    for row in rows:
+        if row['senses'] is not None:
+            known.setdefault(row['lexeme_id'], (row['senses'], row['existing_suru_ids']))
+    entities = wikidata_api.get_entities(
+        [row['lexeme_id'] for row in rows if row['lexeme_id'] and row['lexeme_id'] not in known])
+    for lexeme_id, entity in entities.items():
+        known[lexeme_id] = (entity.get('senses', []),
+                            [v['mainsnak']['datavalue']['value'] for v in
+                             entity.get('claims', {}).get('P12682', []) if 'datavalue' in v['mainsnak']])
+    print(f"Senses and SuRu IDs of {len(known) - len(entities)} lexemes from the matching, {len(entities)} fetched")
+
+    plans = {}
+    unconfirmed = []
+    for row in rows:
+        if row['category_id'] is None:
+            skipped.append({**row, 'reason': f"unknown category {row['category']}"})
+            continue
+        key = row['lexeme_id'] or (row['lemma'], row['category_id'])
+        if key not in plans:
+            senses, existing_suru_ids = known.get(row['lexeme_id'], ([], []))
+            plans[key] = {
+                'lexeme_id': row['lexeme_id'],
+                'lemma': row['lemma'],
+                'category_id': row['category_id'],
+                'existing_suru_ids': set(existing_suru_ids),
+                'has_senses': len(senses) > 0,
+                'data': {'claims': [], 'senses': []},
+                'suru_ids': [],
+            }
+            if not row['lexeme_id']:
+                plans[key]['data'].update({
+                    'type': 'lexeme',
+                    'lemmas': {'fi': {'language': 'fi', 'value': row['lemma']}},
+                    'language': 'Q1412',
+                    'lexicalCategory': row['category_id'],
+                })
+        plan = plans[key]
+        if row['suru_value'] not in plan['existing_suru_ids'] and row['suru_value'] not in plan['suru_ids']:
+            plan['data']['claims'].append(string_statement('P12682', row['suru_value']))
+            plan['suru_ids'].append(row['suru_value'])
+        # Like add(), only give a sense to lexemes without senses
+        if not plan['has_senses'] and not plan['data']['senses']:
+            if row['sense_item']:
+                plan['data']['senses'].append(new_sense(row['sv_gloss'], row['sense_item']))
+            else:
+                unconfirmed.append({**row, 'reason': 'sense not confirmed'})
+
+    edits = []
+    for plan in plans.values():
+        if plan['lexeme_id'] and not plan['data']['claims'] and not plan['data']['senses']:
+            skipped.append({'lexeme_id': plan['lexeme_id'], 'lemma': plan['lemma'], 'reason': 'already done'})
+            continue
+        edits.append(plan)
+    return edits, skipped, unconfirmed
+
+def describe(edit):
+    target = edit['lexeme_id'] or 'new lexeme'
+    return (f"{target} {edit['lemma']} ({edit['category_id']}): "
+            f"+{len(edit['data']['claims'])} P12682, +{len(edit['data']['senses'])} sense")
+
+def apply_edit(write_session, edit, summary):
+    request = {'action': 'wbeditentity', 'data': json.dumps(edit['data']), 'summary': summary,
+               'maxlag': wikidata_api.MAXLAG}
+    if edit['lexeme_id']:
+        request['id'] = edit['lexeme_id']
+    else:
+        request['new'] = 'lexeme'
+    for attempt in range(wikidata_api.MAX_RETRIES + 1):
+        result = write_session.post(request)
+        if result.get('error', {}).get('code') != 'maxlag':
+            return result
+        print("Wikidata is lagging, waiting 5s")
+        time.sleep(5)
+    return result
+
+def run_batch(df, dry_run=True, delay=1.0, report_path='07_batch_report.jsonl', summary='SuRu batch import',
+              confirmed_senses=None):
+    with metrics.stage('plan'):
+        edits, skipped, unconfirmed = plan_edits(df, confirmed_senses)
+    print(f"Planned {len(edits)} edits, skipped {len(skipped)}, "
+          f"{len(unconfirmed)} rows without a confirmed sense get no sense")
+
+    write_session = None
+    if not dry_run:
+        # Import the module with a number prefix
+        spec = importlib.util.spec_from_file_location("create_lex", "07_create_lex.py")
+        create_lex = importlib.util.module_from_spec(spec)
+        sys.modules["create_lex"] = create_lex
+        spec.loader.exec_module(create_lex)
+        write_session = create_lex.get_write_session()
+
+    counts = {'planned': 0, 'done': 0, 'failed': 0}
+    with open(report_path, 'w', encoding='utf-8') as report:
+        for item in skipped:
+            report.write(json.dumps({'status': 'skipped', **item}, ensure_ascii=False) + '\n')
+        for item in unconfirmed:
+            report.write(json.dumps({'status': 'sense_skipped', **item}, ensure_ascii=False) + '\n')
+        for i, edit in enumerate(edits, start=1):
+            record = {'lexeme_id': edit['lexeme_id'], 'lemma': edit['lemma'], 'category_id': edit['category_id'],
+                      'suru_ids': edit['suru_ids'], 'senses': len(edit['data']['senses'])}
+            if dry_run:
+                print(f"{i} / {len(edits)} would edit {describe(edit)}")
+                record['status'] = 'planned'
+            else:
+                with metrics.stage('edit'):
+                    result = apply_edit(write_session, edit, summary)
+                if result.get('success'):
+                    record['lexeme_id'] = result['entity']['id']
+                    record['status'] = 'done'
+                    print(f"{i} / {len(edits)} edited {describe(edit)}, URL: https://www.wikidata.org/wiki/Lexeme:{record['lexeme_id']}")
+                else:
+                    record['status'] = 'failed'
+                    record['error'] = result.get('error')
+                    print(f"{i} / {len(edits)} failed {describe(edit)}: {result.get('error')}")
+                # Throttle writes
+                time.sleep(delay)
+            counts[record['status']] += 1
+            metrics.inc('batch_edits', status=record['status'])
+            report.write(json.dumps(record, ensure_ascii=False) + '\n')
+            report.flush()
+    print(f"Report saved to {report_path}: {counts}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create lexemes and add SuRu IDs and senses in batch from the 06 matching output")
+    parser.add_argument('--input', default='06_vanligaste', help='Matched table (default: 06_vanligaste)')
+    parser.add_argument('--limit', type=int, help='Only process the first N rows')
+    parser.add_argument('--dry-run', action='store_true', help='Only plan the edits and write the report')
+    parser.add_argument('--delay', type=float, default=1.0, help='Seconds to wait between edits (default: 1)')
+    parser.add_argument('--senses', help='CSV or xlsx of confirmed senses (suru_id, sv_gloss, p5137); '
+                                         'without it no senses are added')
+    args = parser.parse_args()
+    metrics.report_at_exit('07_batch')
+
+    # Plan from fresh entity data, not from the response cache
+    wikidata_api.configure(cache_path=None)
+    df = read_table(args.input, columns=COLUMNS + [c for c in MATCH_COLUMNS if c in table_columns(args.input)])
+    if args.limit:
+        df = df.head(args.limit)
+    run_batch(df, args.dry_run, args.delay, confirmed_senses=read_confirmed_senses(args.senses) if args.senses else None)
@@ -1,6 +1,25 @@
-from flask import Flask, request, jsonify
+import time
+# Startup time is measured from here, before the imports
+started = time.perf_counter()
+
+from flask import Flask, Response, request, jsonify, url_for
+from flask.helpers import get_debug_flag
+import argparse
 import importlib.util
+import json
+import os
+import re
 import sys
+import threading
+
+import entry_store
+import metrics
+import page_lookup
+import search_index
+import translation_index
+import wikidata_api
+from job_queue import JobQueue
+from proxy_cache import ProxyCache
 
 # Import the module with a number prefix
 spec = importlib.util.spec_from_file_location("create_lex", "07_create_lex.py")
@@ -10,10 +29,88 @@ spec.loader.exec_module(create_lex)
 
 app = Flask(__name__)
 
+# Lexeme edits run in background workers; pending jobs survive a restart
+jobs = JobQueue(create_lex.add, '07_jobs.sqlite', workers=2)
+
+# Cached Wikidata lookups for the browser extension
+proxy = ProxyCache('07_proxy_cache.sqlite')
+
+# Swedish to Finnish index of the SuRu translations (see translation_index.py), None if not built
+translations = translation_index.open_index()
+
+# The whole SuRu corpus, memory-mapped (see entry_store.py), None if not built
+entries = entry_store.open_store()
+# Local headword and translation search over the same entries, None if not built
+search = search_index.open_index(entries)
+
+# Wikidata logins are made on the first edit, or ahead of it in the background by /warmup or --warm-up
+warmup = {'status': 'cold', 'error': None, 'login_seconds': None}
+warmup_lock = threading.Lock()
+
+def start_warm_up():
+    """
+    Log in to Wikidata in a background thread unless already logged in or logging in.
+    """
+    with warmup_lock:
+        if warmup['status'] in ('warming', 'ready'):
+            return
+        warmup.update(status='warming', error=None)
+    threading.Thread(target=warm_up, name='warm-up', daemon=True).start()
+
+def warm_up():
+    start = time.perf_counter()
+    try:
+        create_lex.warm_up()
+        status, error = 'ready', None
+    except Exception as e:
+        status, error = 'failed', str(e)
+        print(f"Warm-up failed, logging in on the first edit instead: {e}")
+    with warmup_lock:
+        warmup.update(status=status, error=error, login_seconds=round(time.perf_counter() - start, 3))
+
+def reloader_parent():
+    """
+    True in the process of the debug reloader that only watches the files and
+    restarts its child process, which serves the requests.
+    """
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        return False
+    if __name__ == '__main__':
+        # Run as a script the server always uses the reloader, see app.run below
+        return True
+    # Under flask run the reloader is on with --reload, or with --debug unless --no-reload
+    return '--reload' in sys.argv or (get_debug_flag() and '--no-reload' not in sys.argv)
+
+# Resume jobs left from a previous run in the process serving requests
+if not reloader_parent():
+    jobs.start()
+
+startup_seconds = time.perf_counter() - started
+
+# The extension calls the server from the kaino.kotus.fi page; other web pages may not
+ALLOWED_ORIGINS = {'https://kaino.kotus.fi', 'http://localhost:5001', 'http://127.0.0.1:5001'}
+
+@app.before_request
+def reject_other_origins():
+    origin = request.headers.get('Origin')
+    if origin is not None and origin not in ALLOWED_ORIGINS:
+        return jsonify({'error': f'Origin not allowed: {origin}'}), 403
+
+@app.after_request
+def allow_extension(response):
+    origin = request.headers.get('Origin')
+    if origin in ALLOWED_ORIGINS:
+        response.headers['Access-Control-Allow-Origin'] = origin
+        response.headers['Access-Control-Allow-Headers'] = 'Content-Type'
+    response.headers['Vary'] = 'Origin'
+    return response
+
 @app.route('/add', methods=['GET'])
 def add_lexeme():
     """
-    Add a lexeme with parameters from URL query string.
+    Queue adding a lexeme with parameters from URL query string.
+    Returns a job id right away; follow the job at /jobs/<job_id>.
+    While a job with the same parameters is pending, its job id is returned.
     
     Parameters:
     - lang: language code (e.g., 'fi')
@@ -41,23 +138,24 @@ def add_lexeme():
                 'error': 'Missing required parameters. Required: lang, lemma, category. Optional: suru_id, sv_gloss, betydelse_objekt'
             }), 400
         
-        # Call the add function
-        result = create_lex.add(lang, lemma, category, suru_id, sv_gloss, betydelse_objekt)
-        
+        parameters = {
+            'lang': lang,
+            'lemma': lemma,
+            'category': category,
+            'suru_id': suru_id,
+            'sv_gloss': sv_gloss,
+            'betydelse_objekt': betydelse_objekt
+        }
+        # Requests for the same lemma with another SuRu ID, gloss or object are jobs of their own
+        job_id, duplicate = jobs.submit(parameters, key=json.dumps(parameters, sort_keys=True))
+
         return jsonify({
             'success': True,
-            'message': f'Successfully processed lexeme: {lang}:{lemma} ({category})',
-            'lexeme_id': result['lexeme_id'],
-            'lexeme_url': result['lexeme_url'],
-            'parameters': {
-                'lang': lang,
-                'lemma': lemma,
-                'category': category,
-                'suru_id': suru_id,
-                'sv_gloss': sv_gloss,
-                'betydelse_objekt': betydelse_objekt
-            }
-        })
+            'message': f'{"Already queued" if duplicate else "Queued"} lexeme: {lang}:{lemma} ({category})',
+            'job_id': job_id,
+            'status_url': url_for('job_status', job_id=job_id, _external=True),
+            'parameters': parameters
+        }), 202
         
     except Exception as e:
         return jsonify({
@@ -65,6 +163,185 @@ def add_lexeme():
             'message': 'An error occurred while processing the request'
         }), 500
 
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """
+    Status of a queued /add job: queued, running, done (with lexeme_id and
+    lexeme_url in result) or failed (with error).
+    """
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': f'Unknown job: {job_id}'}), 404
+    return jsonify(job)
+
+@app.route('/proxy/sparql', methods=['GET', 'POST'])
+def proxy_sparql():
+    """
+    SPARQL query against the Wikidata Query Service, cached.
+    Takes the query in the query parameter (URL or form encoded).
+    """
+    query = request.values.get('query')
+    if not query:
+        return jsonify({'error': 'Missing required parameter: query'}), 400
+    params = {'query': query, 'format': 'json'}
+    try:
+        data = proxy.get(wikidata_api.SPARQL_URL, params,
+                         lambda: wikidata_api.fetch_json(wikidata_api.SPARQL_URL, params, method='POST'))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 502
+    return jsonify(data)
+
+@app.route('/proxy/sitelinks/<qid>', methods=['GET'])
+def proxy_sitelinks(qid):
+    """
+    Trimmed sitelinks of an item, cached: {sv, fi, en, otherCount}.
+    """
+    if not re.fullmatch(r'Q\d+', qid):
+        return jsonify({'error': f'Not an item id: {qid}'}), 400
+    try:
+        data = page_lookup.cached_sitelinks(proxy, [qid])[qid]
+    except Exception as e:
+        return jsonify({'error': str(e)}), 502
+    return jsonify(data)
+
+@app.route('/page', methods=['GET'])
+def page():
+    """
+    Everything the extension shows for one Kotus page in one response.
+
+    Parameters:
+    - suru_id: SuRu ID without the SURU_ prefix (optional)
+    - words: Swedish translation word, repeated for each word (optional)
+
+    Returns lexemes (Finnish lexemes with the SuRu ID), translations (Swedish
+    lexemes per word) and sitelinks (per P5137 item).
+    """
+    suru_id = request.args.get('suru_id')
+    words = request.args.getlist('words')
+    try:
+        return jsonify(page_lookup.lookup_page(proxy, suru_id, words))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 502
+
+@app.route('/translations', methods=['GET'])
+def find_translations():
+    """
+    SuRu entries that translate to a Swedish word, from the local translation index.
+
+    Parameters:
+    - sv: Swedish word
+
+    Example URL:
+    http://localhost:5001/translations?sv=hus
+    """
+    term = request.args.get('sv')
+    if not term:
+        return jsonify({'error': 'Missing required parameter: sv'}), 400
+    if translations is None:
+        return jsonify({'error': 'Translation index not built, run 03_suru_xlsx.py or translation_index.py'}), 404
+    return jsonify({'term': term, 'entries': translations.lookup(term)})
+
+@app.route('/entries/<suru_id>', methods=['GET'])
+def entry(suru_id):
+    """
+    SuRu entry by its ID
+
+    Example URL:
+    http://localhost:5001/entries/SURU_7107788c441b76dfdb12e2eb7ab5a1a2
+    """
+    if entries is None:
+        return jsonify({'error': 'Entry store not built, run 03_suru_xlsx.py or entry_store.py'}), 404
+    found = entries.get(suru_id)
+    if found is None:
+        return jsonify({'error': f'Unknown SuRu ID: {suru_id}'}), 404
+    return jsonify(found)
+
+@app.route('/entries', methods=['GET'])
+def entries_by_headword():
+    """
+    SuRu entries with a headword
+
+    Parameters:
+    - headword: Finnish headword, matched exactly
+
+    Example URL:
+    http://localhost:5001/entries?headword=haaste
+    """
+    headword = request.args.get('headword')
+    if not headword:
+        return jsonify({'error': 'Missing required parameter: headword'}), 400
+    if entries is None:
+        return jsonify({'error': 'Entry store not built, run 03_suru_xlsx.py or entry_store.py'}), 404
+    return jsonify({'headword': headword, 'entries': entries.by_headword(headword)})
+
+@app.route('/search', methods=['GET'])
+def search_entries():
+    """
+    Search SuRu headwords (lang=fi) or Swedish translations (lang=sv) without network calls
+
+    Parameters:
+    - q: Search text
+    - lang: fi or sv (default: fi)
+    - mode: prefix or fuzzy (default: prefix)
+    - limit: Number of terms, 1 to 100 (default: 20)
+    - distance: Largest edit distance of fuzzy matches, 0 to 3 (default: 2)
+
+    Example URL:
+    http://localhost:5001/search?q=haas&mode=prefix
+    """
+    text = request.args.get('q')
+    if not text:
+        return jsonify({'error': 'Missing required parameter: q'}), 400
+    language = request.args.get('lang', 'fi')
+    mode = request.args.get('mode', 'prefix')
+    if language not in search_index.LANGUAGES or mode not in ('prefix', 'fuzzy'):
+        return jsonify({'error': 'lang must be fi or sv and mode prefix or fuzzy'}), 400
+    if search is None:
+        return jsonify({'error': 'Search index not built, run 03_suru_xlsx.py or search_index.py'}), 404
+    # Bounded so one request cannot list every term or scan for far-off matches
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    if mode == 'prefix':
+        matches = search.prefix(text, language, limit)
+    else:
+        distance = min(max(request.args.get('distance', 2, type=int), 0), 3)
+        matches = search.fuzzy(text, language, distance, limit)
+    return jsonify({'q': text, 'lang': language, 'mode': mode, 'matches': matches})
+
+@app.route('/proxy/stats', methods=['GET'])
+def proxy_stats():
+    return jsonify(proxy.stats())
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    """
+    Readiness: 200 once logged in to Wikidata, 503 before (edits still work and log in on demand)
+    """
+    with warmup_lock:
+        state = dict(warmup)
+    state['startup_ms'] = round(startup_seconds * 1000, 1)
+    return jsonify(state), 200 if state['status'] == 'ready' else 503
+
+@app.route('/warmup', methods=['GET', 'POST'])
+def start_warmup():
+    """
+    Start logging in to Wikidata in the background; follow it at /ready
+    """
+    start_warm_up()
+    with warmup_lock:
+        return jsonify(dict(warmup)), 202
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """
+    Request, cache and job metrics in Prometheus text format
+    """
+    gauges = {
+        'jobs': [({'status': status}, count) for status, count in jobs.counts().items()],
+        'proxy_memory_entries': [({}, proxy.stats()['memory_entries'])],
+        'startup_seconds': [({}, round(startup_seconds, 3))],
+    }
+    return Response(metrics.prometheus_text(gauges=gauges), mimetype='text/plain; version=0.0.4')
+
 @app.route('/', methods=['GET'])
 def home():
     """
@@ -77,13 +354,33 @@ def home():
             'method': 'GET',
             'required_parameters': ['lang', 'lemma', 'category'],
             'optional_parameters': ['suru_id', 'sv_gloss', 'betydelse_objekt'],
+            'returns': 'job_id, follow the job at /jobs/<job_id>',
             'example': 'http://localhost:5001/add?lang=fi&lemma=haaste&category=noun&suru_id=SURU_7107788c441b76dfdb12e2eb7ab5a1a2&sv_gloss=utmaning&betydelse_objekt=Q16511806'
-        }
+        },
+        'page': '/page?suru_id=...&words=...&words=...',
+        'translations': '/translations?sv=...',
+        'entries': ['/entries/<suru_id>', '/entries?headword=...'],
+        'search': '/search?q=...&lang=fi|sv&mode=prefix|fuzzy',
+        'proxy': {
+            'sparql': '/proxy/sparql?query=...',
+            'sitelinks': '/proxy/sitelinks/<qid>',
+            'stats': '/proxy/stats'
+        },
+        'metrics': '/metrics',
+        'ready': '/ready',
+        'warmup': '/warmup'
     })
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Flask server creating lexemes and serving lookups for the browser extension")
+    parser.add_argument('--warm-up', action='store_true',
+                        help='Log in to Wikidata in the background on start instead of on the first edit')
+    args = parser.parse_args()
     print("Starting Suru Wikidata Lexeme Creator Flask server...")
     print("Server will be available at: http://localhost:5001")
-    print("Use /add endpoint with GET parameters to create lexemes")
+    print("Use /add endpoint with GET parameters to create lexemes, /jobs/<job_id> for their status")
     print("Example: http://localhost:5001/add?lang=fi&lemma=haaste&category=noun")
-    app.run(debug=True, host='0.0.0.0', port=5001) 
\ No newline at end of file
+    print(f"Started in {startup_seconds * 1000:.0f} ms")
+    if args.warm_up and not reloader_parent():
+        start_warm_up()
+    app.run(debug=True, host='127.0.0.1', port=5001) 
\ No newline at end of file
@@ -0,0 +1,128 @@
+import argparse
+import os
+import random
+from xml.sax.saxutils import escape
+
+import pandas as pd
+
+# Number of entries in the SuRu download, the 1x scale
+FULL_SIZE = 110000
+ENTRIES_PER_FILE = 5000
+
+FI_SYLLABLES = ['ta', 'lo', 'kuu', 'si', 'ha', 'as', 'te', 'ki', 'jä', 'rvi', 'mä', 'ki', 'pu', 'u', 'ko', 'ti',
+                'vä', 'ri', 'sa', 'na', 'le', 'hti', 'ne', 'n', 'ma', 'a', 'öl', 'y', 'kä', 'työ']
+SV_SYLLABLES = ['hus', 'gran', 'bo', 'ka', 'stol', 'sjö', 'vä', 'g', 'ar', 'be', 'te', 'ord', 'ut', 'man',
+                'ning', 'da', 'gå', 'sk', 'ap', 'ö', 'ra', 'fisk', 'ljus', 'tid', 'en', 'mål']
+CATEGORIES = ['substantiivi', 'verbi', 'adjektiivi', 'adverbi', 'pronomini', 'numeraali', 'interjektio']
+CATEGORY_WEIGHTS = [60, 18, 14, 5, 1, 1, 1]
+SUBCATEGORISATIONS = ['s', 'v', 'a', 'adv']
+
+def make_word(rng, syllables, low, high):
+    return ''.join(rng.choice(syllables) for _ in range(rng.randint(low, high)))
+
+def make_vocabulary(rng, syllables, size, low, high):
+    words = []
+    seen = set()
+    while len(words) < size:
+        word = make_word(rng, syllables, low, high)
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    return words
+
+def zipf_choice(rng, words):
+    # Common words come up far more often, as in the real translations
+    return words[min(int(rng.paretovariate(1.1)) - 1, len(words) - 1)]
+
+def translation_ctn(rng, swedish):
+    inflection = ''
+    if rng.random() < 0.3:
+        inflection = f"<InflectionCtn><Gloss>{escape(zipf_choice(rng, swedish))}</Gloss></InflectionCtn>"
+    return f"<TranslationCtn><Translation>{escape(zipf_choice(rng, swedish))}</Translation>{inflection}</TranslationCtn>"
+
+def translation_block(rng, swedish):
+    definition = ''
+    if rng.random() < 0.2:
+        definition = f"<DefinitionCtn><Definition>{escape(make_word(rng, FI_SYLLABLES, 3, 6))}</Definition></DefinitionCtn>"
+    translations = ''.join(translation_ctn(rng, swedish) for _ in range(rng.randint(1, 4)))
+    return f"<TranslationBlock>{definition}{translations}</TranslationBlock>"
+
+def example_block(rng, swedish):
+    example = ' '.join(make_word(rng, FI_SYLLABLES, 2, 4) for _ in range(rng.randint(2, 5)))
+    return (f"<div><ExampleBlock><ExampleCtn><Example>{escape(example)}</Example></ExampleCtn>"
+            f"{translation_ctn(rng, swedish)}</ExampleBlock></div>")
+
+def make_entry(rng, n, headword, swedish):
+    """
+    One DictionaryEntry following the element tree of 02_xml_structure.xml.
+    """
+    parts = [f'<DictionaryEntry id="SURU_{n:032x}">']
+    see_also = '<SeeAlso style="ks"/>' if rng.random() < 0.05 else ''
+    parts.append(f"<HeadwordCtn><Headword>{escape(headword)}</Headword><SearchForm>{escape(headword)}</SearchForm>"
+                 f"<SortKey>{escape(headword)}</SortKey>{see_also}"
+                 f"<Subcategorisation>{rng.choice(SUBCATEGORISATIONS)}</Subcategorisation></HeadwordCtn>")
+    if rng.random() < 0.1:
+        parts.append(f'<SeeAlso><label>ks.</label><Ptr style="viittaus">{escape(make_word(rng, FI_SYLLABLES, 2, 4))}</Ptr></SeeAlso>')
+    else:
+        parts.append(translation_block(rng, swedish))
+        if rng.random() < 0.3:
+            parts.append(example_block(rng, swedish))
+        # Entries with several senses
+        if rng.random() < 0.25:
+            for _ in range(rng.randint(2, 4)):
+                parts.append(f"<SenseGrp>{translation_block(rng, swedish)}</SenseGrp>")
+    parts.append('</DictionaryEntry>')
+    return ''.join(parts)
+
+def generate(output_dir, entries, seed=1):
+    """
+    Write a synthetic SuRu corpus of the given size to output_dir: XML files
+    in output_dir/suru and the word lists used by steps 4 and 5.
+    """
+    rng = random.Random(seed)
+    suru_dir = os.path.join(output_dir, 'suru')
+    os.makedirs(suru_dir, exist_ok=True)
+
+    headwords = make_vocabulary(rng, FI_SYLLABLES, entries, 2, 5)
+    # Homonyms: some headwords appear in several entries
+    for i in rng.sample(range(entries), entries // 50):
+        headwords[i] = headwords[rng.randrange(entries)]
+    swedish = make_vocabulary(rng, SV_SYLLABLES, max(entries // 2, 10), 1, 4)
+
+    for file_number, start in enumerate(range(0, entries, ENTRIES_PER_FILE)):
+        path = os.path.join(suru_dir, f"SuRu-{file_number:03d}.xml")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('<?xml version="1.0" encoding="UTF-8"?>\n<Dictionary>\n')
+            for n in range(start, min(start + ENTRIES_PER_FILE, entries)):
+                f.write(make_entry(rng, n, headwords[n], swedish) + '\n')
+            f.write('</Dictionary>\n')
+
+    # Nykysuomen sanalista: most headwords, some with two categories
+    unique = list(dict.fromkeys(headwords))
+    rows = []
+    for word in unique:
+        if rng.random() < 0.9:
+            rows.append((word, '', rng.choices(CATEGORIES, CATEGORY_WEIGHTS)[0], rng.randint(1, 99)))
+            if rng.random() < 0.01:
+                rows.append((word, '2', rng.choice(CATEGORIES), rng.randint(1, 99)))
+    pd.DataFrame(rows, columns=['Hakusana', 'Homonymia', 'Sanaluokka', 'Taivutustiedot']).to_csv(
+        os.path.join(output_dir, 'nykysuomensanalista2024.txt'), sep='\t', index=False)
+
+    # Subset lists of step 5
+    suom_lista = rng.sample(unique, len(unique) * 3 // 10)
+    with open(os.path.join(output_dir, 'kotus uppsl-med-suom-lista.txt'), 'w', encoding='utf-8') as f:
+        f.write('\n'.join(suom_lista) + '\n')
+    vanligaste = rng.sample(unique, max(len(unique) // 50, 1))
+    pd.DataFrame({'Label': vanligaste, 'Searches': [int(rng.paretovariate(1.2) * 10) for _ in vanligaste]}).to_excel(
+        os.path.join(output_dir, 'kotus Vanligaste sökningarna jan-mars 2025.xlsx'), index=False)
+
+    print(f"Generated {entries} entries in {output_dir}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic SuRu corpus and word lists for benchmarking")
+    parser.add_argument('output', help='Directory to write suru/ and the word lists to')
+    parser.add_argument('--scale', type=float, default=1.0, help=f'Size as a multiple of {FULL_SIZE} entries (default: 1)')
+    parser.add_argument('--entries', type=int, help='Number of entries, overrides --scale')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed (default: 1)')
+    args = parser.parse_args()
+    generate(args.output, args.entries or int(args.scale * FULL_SIZE), args.seed)
@@ -0,0 +1,136 @@
+import argparse
+import hashlib
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+def stable_hash(text):
+    return int(hashlib.md5(text.encode('utf-8')).hexdigest()[:8], 16)
+
+def lexeme_id(word):
+    return f"L{stable_hash(word) % 1000000 + 1}"
+
+def item_id(word):
+    return f"Q{stable_hash('item ' + word) % 10000000 + 1}"
+
+def has_lexeme(word):
+    # About a third of the words have a lexeme
+    return stable_hash(word) % 3 == 0
+
+def lexeme_category(word):
+    return 'substantiivi' if stable_hash(word) % 4 else 'verbi'
+
+class MockWikidata(BaseHTTPRequestHandler):
+    """
+    Stand-in for the Wikidata API and query service with deterministic answers
+    and a fixed latency per request: wbsearchentities, wbgetentities and SPARQL
+    lexeme queries. GET /stats returns the request counts.
+    """
+    latency = 0.0
+    counts = {}
+    lexemes = {}
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def count(self, name):
+        with self.lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    def reply(self, data):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def search(self, params):
+        word = params['search']
+        if params.get('type') == 'lexeme':
+            if not has_lexeme(word):
+                return {'search': []}
+            lid = lexeme_id(word)
+            with self.lock:
+                self.lexemes[lid] = word
+            return {'search': [{
+                'id': lid,
+                'concepturi': f"http://www.wikidata.org/entity/{lid}",
+                'display': {'label': {'value': word, 'language': params.get('language', 'fi')},
+                            'description': {'value': f"{params.get('language', 'fi')}, {lexeme_category(word)}"}},
+            }]}
+        return {'search': [{'id': item_id(word), 'display': {'label': {'value': word}}}]}
+
+    def entities(self, params):
+        entities = {}
+        for entity_id in params['ids'].split('|'):
+            if entity_id.startswith('Q'):
+                entities[entity_id] = {'id': entity_id, 'sitelinks': {
+                    'svwiki': {'title': entity_id, 'url': f"https://sv.wikipedia.org/wiki/{entity_id}"}}}
+                continue
+            word = self.lexemes.get(entity_id, entity_id)
+            entities[entity_id] = {'id': entity_id, 'claims': {}, 'senses': [{
+                'id': f"{entity_id}-S1",
+                'claims': {'P5137': [{'mainsnak': {'datavalue': {'value': {'id': item_id(word)}}}}]},
+            }]}
+        return {'entities': entities}
+
+    def sparql(self, query):
+        bindings = []
+        entity = 'http://www.wikidata.org/entity/'
+        for lemma, category in re.findall(r'\("((?:[^"\\]|\\.)*)"@fi "([^"]*)"@fi\)', query):
+            if has_lexeme(lemma) and lexeme_category(lemma) == category:
+                lid = lexeme_id(lemma)
+                bindings.append({'lexeme': {'value': entity + lid}, 'lemma': {'value': lemma},
+                                 'categoryLabel': {'value': category}, 'sense': {'value': f"{entity}{lid}-S1"},
+                                 'item': {'value': entity + item_id(lemma)}})
+        return {'results': {'bindings': bindings}}
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == '/stats':
+            with self.lock:
+                return self.reply(dict(self.counts))
+        time.sleep(self.latency)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        action = params.get('action', 'unknown')
+        self.count(action)
+        if action == 'wbsearchentities':
+            return self.reply(self.search(params))
+        if action == 'wbgetentities':
+            return self.reply(self.entities(params))
+        self.reply({'error': {'code': 'unknown_action', 'info': action}})
+
+    def do_POST(self):
+        time.sleep(self.latency)
+        self.count('sparql')
+        length = int(self.headers.get('Content-Length', 0))
+        params = parse_qs(self.rfile.read(length).decode('utf-8'))
+        self.reply(self.sparql(params.get('query', [''])[0]))
+
+def start_server(port=0, latency=0.0):
+    """
+    Start the mock in a background thread. Returns the server; its base URL is
+    http://127.0.0.1:{server.server_port}.
+    """
+    handler = type('Handler', (MockWikidata,), {'latency': latency, 'counts': {}, 'lexemes': {}})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a mock Wikidata API with injected latency")
+    parser.add_argument('--port', type=int, default=8765, help='Port (default: 8765)')
+    parser.add_argument('--latency', type=float, default=50, help='Milliseconds added to every request (default: 50)')
+    args = parser.parse_args()
+    server = start_server(args.port, args.latency / 1000)
+    print(f"Mock Wikidata at http://127.0.0.1:{server.server_port}/w/api.php and /sparql, stats at /stats")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
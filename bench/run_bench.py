@@ -0,0 +1,125 @@
+import argparse
+import datetime
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+
+from generate_suru import FULL_SIZE, generate
+from mock_wikidata import start_server
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+RESULTS = os.path.join(BENCH_DIR, 'results.jsonl')
+
+def steps(jobs, api_url, sparql_url, backend, concurrency, rate):
+    """
+    The pipeline steps to time, as (name, command). They run in the work directory in this order.
+    """
+    return [
+        ('parse', ['02_overview_pretty.py', '--jobs', str(jobs)]),
+        ('extract', ['03_suru_xlsx.py', '--jobs', str(jobs)]),
+        ('category join', ['04_cat.py']),
+        ('filter', ['05_filter.py']),
+        ('matching', ['06_match_lexeme.py', '--input', '05_vanligaste', '--backend', backend, '--no-cache',
+                      '--api-url', api_url, '--sparql-url', sparql_url,
+                      '--concurrency', str(concurrency), '--rate', str(rate)]),
+    ]
+
+def run_step(name, command, work_dir):
+    """
+    Run one step as a child process, with its output in <work_dir>/<name>.log.
+    Returns the wall time and the peak memory (RSS) of the process.
+    """
+    log_path = os.path.join(work_dir, f"{name.replace(' ', '_')}.log")
+    start = time.perf_counter()
+    with open(log_path, 'w', encoding='utf-8') as log:
+        process = subprocess.Popen([sys.executable, os.path.join(REPO_DIR, command[0]), *command[1:]],
+                                   cwd=work_dir, stdout=log, stderr=subprocess.STDOUT)
+        _, status, usage = os.wait4(process.pid, 0)
+    seconds = time.perf_counter() - start
+    if status != 0:
+        raise RuntimeError(f"{name} failed, see {log_path}")
+    # ru_maxrss is in kilobytes on Linux
+    return {'seconds': round(seconds, 3), 'max_rss_mb': round(usage.ru_maxrss / 1024, 1)}
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def previous_result(result):
+    """
+    The last stored run with the same settings, or None.
+    """
+    if not os.path.exists(RESULTS):
+        return None
+    previous = None
+    with open(RESULTS, encoding='utf-8') as f:
+        for line in f:
+            run = json.loads(line)
+            if run['settings'] == result['settings']:
+                previous = run
+    return previous
+
+def print_report(result, previous):
+    print(f"\n{'step':<15} {'seconds':>9} {'change':>8} {'max RSS MB':>11} {'change':>8}")
+    for name, step in result['steps'].items():
+        before = previous['steps'].get(name) if previous else None
+        seconds_change = f"{step['seconds'] / before['seconds'] - 1:+.0%}" if before and before['seconds'] else ''
+        rss_change = f"{step['max_rss_mb'] / before['max_rss_mb'] - 1:+.0%}" if before and before['max_rss_mb'] else ''
+        print(f"{name:<15} {step['seconds']:>9.2f} {seconds_change:>8} {step['max_rss_mb']:>11.1f} {rss_change:>8}")
+    if previous:
+        print(f"Compared with {previous['time']} ({previous['commit']})")
+    print(f"Mock Wikidata requests: {result['requests']}")
+
+def run_bench(entries, jobs=1, latency=0.05, backend='api', concurrency=4, rate=0, only=None, regenerate=False, save=True):
+    work_dir = os.path.join(BENCH_DIR, 'work', str(entries))
+    if regenerate or not os.path.exists(os.path.join(work_dir, 'suru')):
+        generate(work_dir, entries)
+
+    server = start_server(latency=latency)
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    result = {
+        'time': datetime.datetime.now().isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'settings': {'entries': entries, 'jobs': jobs, 'latency_ms': latency * 1000, 'backend': backend,
+                     'concurrency': concurrency, 'rate': rate},
+        'steps': {},
+    }
+    try:
+        for name, command in steps(jobs, f"{base_url}/w/api.php", f"{base_url}/sparql", backend, concurrency, rate):
+            if only and name not in only:
+                continue
+            print(f"Running {name}...")
+            result['steps'][name] = run_step(name, command, work_dir)
+        with urllib.request.urlopen(f"{base_url}/stats") as response:
+            result['requests'] = json.load(response)
+    finally:
+        server.shutdown()
+
+    print_report(result, previous_result(result))
+    if save:
+        with open(RESULTS, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(result) + '\n')
+        print(f"Results appended to {RESULTS}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time and memory-profile pipeline steps 02-06 on a synthetic SuRu corpus")
+    parser.add_argument('--scale', type=float, default=1.0, help=f'Corpus size as a multiple of {FULL_SIZE} entries (default: 1)')
+    parser.add_argument('--entries', type=int, help='Number of entries, overrides --scale')
+    parser.add_argument('--jobs', '-j', type=int, default=1, help='--jobs for steps 02 and 03 (default: 1)')
+    parser.add_argument('--latency', type=float, default=50, help='Mock Wikidata latency per request in ms (default: 50)')
+    parser.add_argument('--backend', choices=['api', 'sparql'], default='api', help='Matching backend of step 6 (default: api)')
+    parser.add_argument('--concurrency', type=int, default=4, help='--concurrency of step 6 (default: 4)')
+    parser.add_argument('--rate', type=float, default=0, help='--rate of step 6, 0 for no limit (default: 0)')
+    parser.add_argument('--steps', nargs='+', help='Only run these steps, e.g. --steps extract "category join"')
+    parser.add_argument('--regenerate', action='store_true', help='Generate the corpus again')
+    parser.add_argument('--no-save', action='store_true', help=f'Do not append the results to {RESULTS}')
+    args = parser.parse_args()
+    run_bench(args.entries or int(args.scale * FULL_SIZE), args.jobs, args.latency / 1000, args.backend,
+              args.concurrency, args.rate, args.steps, args.regenerate, not args.no_save)
@@ -0,0 +1,232 @@
+import argparse
+import json
+import os
+import time
+import zlib
+
+import numpy as np
+
+DEFAULT_PATH = 'entry_store.bin'
+
+# Fields with one string per entry and with a list of strings per entry
+SCALAR_FIELDS = ['suru_id', 'headword', 'subcategorisation', 'ks', 'seealso']
+LIST_FIELDS = ['translations']
+
+# The file starts with the length of a JSON header describing the arrays that follow
+HEADER_SIZE = np.dtype('<u8')
+
+def _table_size(count):
+    # Power of two at least twice the number of strings, so linear probing stays short
+    return 1 << max(4, (2 * count - 1).bit_length())
+
+class _Builder:
+    """
+    Interns the strings of all entries: every distinct string is stored once
+    and fields refer to it by string id.
+    """
+    def __init__(self):
+        self.ids = {}
+        self.encoded = []
+
+    def string_id(self, text):
+        if not isinstance(text, str):
+            return -1
+        sid = self.ids.get(text)
+        if sid is None:
+            sid = self.ids[text] = len(self.encoded)
+            self.encoded.append(text.encode('utf-8'))
+        return sid
+
+    def string_ids(self, texts):
+        return [self.string_id(text) for text in (texts if texts is not None else [])]
+
+    def arrays(self):
+        lengths = np.fromiter((len(data) for data in self.encoded), dtype=np.int64, count=len(self.encoded))
+        offsets = np.zeros(len(self.encoded) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        # Open addressing hash table from crc32 of the UTF-8 bytes to string id
+        table = np.full(_table_size(len(self.encoded)), -1, dtype=np.int32)
+        mask = len(table) - 1
+        for sid, data in enumerate(self.encoded):
+            slot = zlib.crc32(data) & mask
+            while table[slot] >= 0:
+                slot = (slot + 1) & mask
+            table[slot] = sid
+        return {
+            'strings': np.frombuffer(b''.join(self.encoded), dtype=np.uint8),
+            'string_offsets': offsets,
+            'string_table': table,
+        }
+
+def _csr(lists):
+    # Lists of ints as one flat array and offsets, list i is values[offsets[i]:offsets[i + 1]]
+    offsets = np.zeros(len(lists) + 1, dtype=np.int32)
+    np.cumsum([len(values) for values in lists], out=offsets[1:])
+    values = np.fromiter((value for values in lists for value in values), dtype=np.int32, count=int(offsets[-1]))
+    return values, offsets
+
+def _rows_by_string(string_ids, string_count):
+    # Rows of every string id as a CSR, rows of string s are rows[offsets[s]:offsets[s + 1]]
+    string_ids = np.asarray(string_ids, dtype=np.int32)
+    rows = np.argsort(string_ids, kind='stable').astype(np.int32)
+    rows = rows[string_ids[rows] >= 0]
+    offsets = np.searchsorted(string_ids[rows], np.arange(string_count + 1)).astype(np.int32)
+    return rows, offsets
+
+def write_arrays(path, arrays, **header):
+    """
+    Write named numpy arrays to one file that read_arrays can memory-map,
+    with header values stored alongside.
+    """
+    # Arrays are 8-byte aligned after the header so they can be used from the memory map as is
+    header = {**header, 'arrays': {}}
+    position = 0
+    for name, array in arrays.items():
+        header['arrays'][name] = [array.dtype.str, position, len(array)]
+        position += -(-array.nbytes // 8) * 8
+    header_bytes = json.dumps(header).encode('utf-8')
+    header_bytes += b' ' * (-(HEADER_SIZE.itemsize + len(header_bytes)) % 8)
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(np.array(len(header_bytes), dtype=HEADER_SIZE).tobytes())
+        f.write(header_bytes)
+        for array in arrays.values():
+            data = array.tobytes()
+            f.write(data + b'\0' * (-len(data) % 8))
+    os.replace(tmp_path, path)
+
+def read_arrays(path):
+    """
+    Memory-map a file written with write_arrays. Returns the header and the arrays by name.
+    """
+    # A plain ndarray over the map, indexing a np.memmap is several times slower
+    data = np.asarray(np.memmap(path, dtype=np.uint8, mode='r'))
+    header_length = int(data[:HEADER_SIZE.itemsize].view(HEADER_SIZE)[0])
+    start = HEADER_SIZE.itemsize + header_length
+    header = json.loads(data[HEADER_SIZE.itemsize:start].tobytes())
+    arrays = {}
+    for name, (dtype, offset, length) in header.pop('arrays').items():
+        dtype = np.dtype(dtype)
+        arrays[name] = data[start + offset:start + offset + length * dtype.itemsize].view(dtype)
+    return header, arrays
+
+def build_store(df, path=DEFAULT_PATH):
+    """
+    Build the entry store from a table with the columns of step 3.
+    """
+    start = time.perf_counter()
+    builder = _Builder()
+    arrays = {}
+    for field in SCALAR_FIELDS:
+        arrays[field] = np.array([builder.string_id(text) for text in df[field]], dtype=np.int32)
+    for field in LIST_FIELDS:
+        arrays[field], arrays[f'{field}_offsets'] = _csr([builder.string_ids(texts) for texts in df[field]])
+    # Sense groups are lists of lists: entry -> groups -> texts
+    groups = [[builder.string_ids(texts) for texts in (entry_groups if entry_groups is not None else [])]
+              for entry_groups in df['sense_groups']]
+    arrays['sense_group_texts'], arrays['sense_group_offsets'] = _csr([texts for entry in groups for texts in entry])
+    arrays['sense_groups_offsets'] = np.zeros(len(groups) + 1, dtype=np.int32)
+    np.cumsum([len(entry) for entry in groups], out=arrays['sense_groups_offsets'][1:])
+    arrays.update(builder.arrays())
+    string_count = len(builder.encoded)
+    arrays['suru_id_rows'], arrays['suru_id_row_offsets'] = _rows_by_string(arrays['suru_id'], string_count)
+    arrays['headword_rows'], arrays['headword_row_offsets'] = _rows_by_string(arrays['headword'], string_count)
+
+    write_arrays(path, arrays, entries=len(df), strings=string_count)
+    print(f"Stored {len(df)} entries with {string_count} distinct strings in {time.perf_counter() - start:.1f}s: "
+          f"{path} ({os.path.getsize(path) / 1024 / 1024:.1f} MB)")
+
+class EntryStore:
+    """
+    Read access to a store built with build_store. The file is memory-mapped,
+    so opening it is immediate and the pages are shared between processes.
+    """
+    def __init__(self, path=DEFAULT_PATH):
+        header, self._arrays = read_arrays(path)
+        self._entries = header['entries']
+        self._strings = self._arrays['strings']
+        self._string_offsets = self._arrays['string_offsets']
+        self._string_table = self._arrays['string_table']
+
+    def __len__(self):
+        return self._entries
+
+    def _string(self, sid):
+        if sid < 0:
+            return None
+        return self._strings[self._string_offsets[sid]:self._string_offsets[sid + 1]].tobytes().decode('utf-8')
+
+    def _string_id(self, text):
+        data = text.encode('utf-8')
+        mask = len(self._string_table) - 1
+        slot = zlib.crc32(data) & mask
+        while True:
+            sid = int(self._string_table[slot])
+            if sid < 0 or self._strings[self._string_offsets[sid]:self._string_offsets[sid + 1]].tobytes() == data:
+                return sid
+            slot = (slot + 1) & mask
+
+    def _rows(self, field, text):
+        sid = self._string_id(text)
+        if sid < 0:
+            return []
+        offsets = self._arrays[f'{field}_row_offsets']
+        return [int(row) for row in self._arrays[f'{field}_rows'][offsets[sid]:offsets[sid + 1]]]
+
+    def _list(self, field, row):
+        offsets = self._arrays[f'{field}_offsets']
+        return [self._string(int(sid)) for sid in self._arrays[field][offsets[row]:offsets[row + 1]]]
+
+    def entry(self, row):
+        """
+        The entry at row as a dict with the columns of step 3, without content_hash.
+        """
+        entry = {field: self._string(int(self._arrays[field][row])) for field in SCALAR_FIELDS}
+        for field in LIST_FIELDS:
+            entry[field] = self._list(field, row)
+        group_offsets = self._arrays['sense_group_offsets']
+        texts = self._arrays['sense_group_texts']
+        entry['sense_groups'] = [[self._string(int(sid)) for sid in texts[group_offsets[group]:group_offsets[group + 1]]]
+                                 for group in range(*self._arrays['sense_groups_offsets'][row:row + 2])]
+        return entry
+
+    def headline(self, row):
+        """
+        SuRu ID and headword of the entry at row, cheaper than the whole entry.
+        """
+        return {field: self._string(int(self._arrays[field][row])) for field in ['suru_id', 'headword']}
+
+    def get(self, suru_id):
+        """
+        The entry with the SuRu ID, or None.
+        """
+        rows = self._rows('suru_id', suru_id)
+        return self.entry(rows[0]) if rows else None
+
+    def by_headword(self, headword):
+        """
+        Entries with exactly this headword, homonyms in corpus order.
+        """
+        return [self.entry(row) for row in self._rows('headword', headword)]
+
+    def __contains__(self, suru_id):
+        return bool(self._rows('suru_id', suru_id))
+
+def open_store(path=DEFAULT_PATH):
+    """
+    The entry store at path, or None if it has not been built.
+    """
+    if not os.path.exists(path):
+        return None
+    return EntryStore(path)
+
+if __name__ == "__main__":
+    # Imported here so the Flask server does not load pandas
+    from suru_store import read_table
+
+    parser = argparse.ArgumentParser(description="Build the SuRu entry store from the output of step 3")
+    parser.add_argument('--input', default='03_suru', help='Extracted SuRu table (default: 03_suru)')
+    parser.add_argument('--output', default=DEFAULT_PATH, help=f'Store file (default: {DEFAULT_PATH})')
+    args = parser.parse_args()
+    build_store(read_table(args.input, columns=SCALAR_FIELDS + LIST_FIELDS + ['sense_groups']), args.output)
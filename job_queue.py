@@ -0,0 +1,116 @@
+import json
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+
+class JobQueue:
+    """
+    Persisted queue of jobs run by a pool of worker threads.
+    Jobs are stored in SQLite, so jobs queued or running when the server
+    stopped are run again on start(). While a job with the same key is queued
+    or running, submitting another one returns the existing job.
+    """
+    def __init__(self, run, path='07_jobs.sqlite', workers=2):
+        self.run = run
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._executor = None
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                key TEXT NOT NULL,
+                params TEXT NOT NULL,
+                status TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                created REAL NOT NULL,
+                updated REAL NOT NULL
+            )""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_key ON jobs (key, status)")
+        self._db.commit()
+
+    def start(self):
+        """
+        Start the workers and requeue jobs left over from a previous run.
+        """
+        with self._lock:
+            if self._executor is not None:
+                return
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='jobs')
+            self._db.execute("UPDATE jobs SET status = 'queued' WHERE status = 'running'")
+            self._db.commit()
+            pending = [row[0] for row in self._db.execute(
+                "SELECT id FROM jobs WHERE status = 'queued' ORDER BY created")]
+        if pending:
+            print(f"Requeued {len(pending)} pending jobs")
+        for job_id in pending:
+            self._executor.submit(self._run_job, job_id)
+
+    def submit(self, params, key):
+        """
+        Queue a job for params. Returns (job id, True if an identical job was already pending).
+        """
+        self.start()
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id FROM jobs WHERE key = ? AND status IN ('queued', 'running')", (key,)).fetchone()
+            if row is not None:
+                return row[0], True
+            job_id = uuid.uuid4().hex
+            self._db.execute("INSERT INTO jobs VALUES (?, ?, ?, 'queued', NULL, NULL, ?, ?)",
+                             (job_id, key, json.dumps(params), now, now))
+            self._db.commit()
+        self._executor.submit(self._run_job, job_id)
+        return job_id, False
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, params, status, result, error, created, updated FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        return {
+            'job_id': row[0],
+            'parameters': json.loads(row[1]),
+            'status': row[2],
+            'result': json.loads(row[3]) if row[3] else None,
+            'error': row[4],
+            'created': row[5],
+            'updated': row[6],
+        }
+
+    def counts(self):
+        with self._lock:
+            return dict(self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+    def _set_status(self, job_id, status, result=None, error=None):
+        with self._lock:
+            self._db.execute("UPDATE jobs SET status = ?, result = ?, error = ?, updated = ? WHERE id = ?",
+                             (status, json.dumps(result) if result is not None else None, error, time.time(), job_id))
+            self._db.commit()
+
+    def _run_job(self, job_id):
+        with self._lock:
+            claimed = self._db.execute("UPDATE jobs SET status = 'running', updated = ? WHERE id = ? AND status = 'queued'",
+                                       (time.time(), job_id)).rowcount
+            self._db.commit()
+        if not claimed:
+            return
+        job = self.get(job_id)
+        metrics.observe('job_wait', time.time() - job['created'])
+        try:
+            with metrics.timer('job'):
+                result = self.run(**job['parameters'])
+            self._set_status(job_id, 'done', result=result)
+            metrics.inc('jobs', status='done')
+        except Exception as e:
+            traceback.print_exc()
+            self._set_status(job_id, 'failed', error=str(e))
+            metrics.inc('jobs', status='failed')
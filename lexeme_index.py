@@ -0,0 +1,149 @@
+import argparse
+import bz2
+import gzip
+import json
+import os
+import sqlite3
+import time
+
+DEFAULT_PATH = 'lexeme_index.sqlite'
+
+# Wikidata items of the languages kept in the index
+LANGUAGES = {
+    'Q1412': 'fi',
+    'Q9027': 'sv',
+}
+
+# Word categories (Sanaluokka) of Nykysuomen sanalista and their lexical category items
+LEXICAL_CATEGORIES = {
+    'substantiivi': 'Q1084',
+    'verbi': 'Q24905',
+    'adjektiivi': 'Q34698',
+    'adverbi': 'Q380057',
+    'pronomini': 'Q36224',
+    'numeraali': 'Q63116',
+    'interjektio': 'Q83034',
+    'konjunktio': 'Q36484',
+    'prepositio': 'Q4833830',
+    'postpositio': 'Q161873',
+    'partikkeli': 'Q184943',
+    'erisnimi': 'Q147276',
+    'lyhenne': 'Q102786',
+}
+
+def claim_values(claims, prop):
+    values = []
+    for claim in claims.get(prop, []):
+        datavalue = claim['mainsnak'].get('datavalue')
+        if datavalue is None:
+            continue
+        value = datavalue['value']
+        values.append(value['id'] if isinstance(value, dict) else value)
+    return values
+
+def iter_dump(dump_path):
+    """
+    Stream Finnish and Swedish lexemes from a Wikidata lexemes JSON dump
+    (one entity per line, optionally bz2 or gzip compressed).
+    """
+    if dump_path.endswith('.bz2'):
+        f = bz2.open(dump_path, 'rt', encoding='utf-8')
+    elif dump_path.endswith('.gz'):
+        f = gzip.open(dump_path, 'rt', encoding='utf-8')
+    else:
+        f = open(dump_path, encoding='utf-8')
+    with f:
+        for line in f:
+            line = line.strip().rstrip(',')
+            if line in ('', '[', ']'):
+                continue
+            # Skip other languages without decoding the JSON
+            if not any(f'"{language}"' in line for language in LANGUAGES):
+                continue
+            entity = json.loads(line)
+            if entity.get('language') in LANGUAGES:
+                yield entity
+
+def index_rows(entity):
+    """
+    One index row per lemma spelling of a lexeme entity.
+    """
+    language = LANGUAGES[entity['language']]
+    senses = [[sense['id'], claim_values(sense.get('claims', {}), 'P5137')] for sense in entity.get('senses', [])]
+    p12682 = claim_values(entity.get('claims', {}), 'P12682')
+    for lemma in entity.get('lemmas', {}).values():
+        yield (lemma['value'], language, entity['lexicalCategory'], entity['id'],
+               json.dumps(senses), json.dumps(p12682))
+
+def build_index(dump_path, index_path=DEFAULT_PATH):
+    start = time.perf_counter()
+    tmp_path = index_path + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    db = sqlite3.connect(tmp_path)
+    db.execute("""
+        CREATE TABLE lexemes (
+            lemma TEXT NOT NULL,
+            language TEXT NOT NULL,
+            category TEXT NOT NULL,
+            lexeme_id TEXT NOT NULL,
+            senses TEXT NOT NULL,
+            p12682 TEXT NOT NULL,
+            PRIMARY KEY (lemma, language, category, lexeme_id)
+        ) WITHOUT ROWID""")
+    count = 0
+    batch = []
+    for entity in iter_dump(dump_path):
+        batch.extend(index_rows(entity))
+        count += 1
+        if len(batch) >= 10000:
+            db.executemany("INSERT OR REPLACE INTO lexemes VALUES (?, ?, ?, ?, ?, ?)", batch)
+            batch = []
+            print(f"{count} lexemes indexed")
+    db.executemany("INSERT OR REPLACE INTO lexemes VALUES (?, ?, ?, ?, ?, ?)", batch)
+    db.commit()
+    db.close()
+    os.replace(tmp_path, index_path)
+    print(f"Indexed {count} lexemes in {time.perf_counter() - start:.0f}s: {index_path}")
+
+class LexemeIndex:
+    """
+    Read access to an index built with build_index, keyed by
+    (lemma, language code, lexical category item).
+    """
+    def __init__(self, path=DEFAULT_PATH):
+        self._db = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+
+    def lookup(self, lemma, language, category):
+        """
+        Lexemes with the given lemma, e.g. lookup('talo', 'fi', 'Q1084'),
+        in L-id order. Each has its senses with their P5137 items and P12682 values.
+        """
+        rows = self._db.execute(
+            "SELECT lexeme_id, senses, p12682 FROM lexemes WHERE lemma = ? AND language = ? AND category = ?",
+            (lemma, language, category)).fetchall()
+        lexemes = []
+        for lexeme_id, senses, p12682 in sorted(rows, key=lambda row: int(row[0][1:])):
+            senses = json.loads(senses)
+            lexemes.append({
+                'id': lexeme_id,
+                'senses': [sense_id for sense_id, _ in senses],
+                'p5137': senses[0][1][0] if senses and senses[0][1] else '',
+                'p12682': json.loads(p12682),
+            })
+        return lexemes
+
+def open_index(path=DEFAULT_PATH):
+    """
+    The lexeme index at path, or None if it has not been built.
+    """
+    if not os.path.exists(path):
+        return None
+    return LexemeIndex(path)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build a local Finnish and Swedish lexeme index from a Wikidata lexemes dump")
+    parser.add_argument('dump', help='Wikidata lexemes dump, e.g. latest-lexemes.json.bz2')
+    parser.add_argument('--output', default=DEFAULT_PATH, help=f'Index file (default: {DEFAULT_PATH})')
+    args = parser.parse_args()
+    build_index(args.dump, args.output)
@@ -0,0 +1,200 @@
+import atexit
+import json
+import os
+import resource
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds in seconds of the latency histogram buckets
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, float('inf'))
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+_stages = {}
+_started = time.time()
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+def inc(name, amount=1, **labels):
+    """
+    Add amount to the counter name with the given labels, e.g. inc('http_requests', endpoint='wbgetentities').
+    """
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+def observe(name, seconds, **labels):
+    """
+    Add a duration to the histogram name with the given labels.
+    """
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = {'buckets': [0] * len(BUCKETS), 'sum': 0.0, 'count': 0}
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                histogram['buckets'][i] += 1
+                break
+        histogram['sum'] += seconds
+        histogram['count'] += 1
+
+@contextmanager
+def timer(name, **labels):
+    """
+    Observe the duration of the with block in the histogram name.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+def max_rss_mb(who=resource.RUSAGE_SELF):
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(who).ru_maxrss / 1024
+
+def rss_mb():
+    """
+    Current resident memory of the process, from /proc (Linux), or None elsewhere.
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+    except (OSError, ValueError):
+        return None
+
+@contextmanager
+def stage(name):
+    """
+    Record wall time, CPU time and memory growth of a pipeline stage: how
+    much the resident memory grew from start to end, and how much the stage
+    raised the peak of the process (0 if it stayed below an earlier peak).
+    Repeated stages with the same name add up the times and keep the largest growth.
+    """
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    rss = rss_mb()
+    peak = max_rss_mb()
+    try:
+        yield
+    finally:
+        rss_growth = rss_mb() - rss if rss is not None else None
+        peak_growth = max_rss_mb() - peak
+        with _lock:
+            totals = _stages.setdefault(name, {'wall_seconds': 0.0, 'cpu_seconds': 0.0, 'calls': 0,
+                                               'rss_growth_mb': None, 'peak_rss_growth_mb': 0.0})
+            totals['wall_seconds'] += time.perf_counter() - wall
+            totals['cpu_seconds'] += time.process_time() - cpu
+            totals['calls'] += 1
+            if rss_growth is not None and (totals['rss_growth_mb'] is None or rss_growth > totals['rss_growth_mb']):
+                totals['rss_growth_mb'] = rss_growth
+            totals['peak_rss_growth_mb'] = max(totals['peak_rss_growth_mb'], peak_growth)
+
+def _hit_ratios():
+    # Hit ratio of each counter with a result label, e.g. cache lookups; anything but a miss is a hit
+    lookups = {}
+    for (name, labels), value in _counters.items():
+        result = dict(labels).get('result')
+        if result in ('hit', 'miss', 'stale', 'coalesced'):
+            totals = lookups.setdefault(name, {'hit': 0, 'total': 0})
+            totals['total'] += value
+            if result != 'miss':
+                totals['hit'] += value
+    return {name: round(totals['hit'] / totals['total'], 3) for name, totals in lookups.items() if totals['total']}
+
+def snapshot():
+    """
+    All metrics as a JSON-serializable dict.
+    """
+    with _lock:
+        return {
+            'started': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(_started)),
+            'wall_seconds': round(time.time() - _started, 3),
+            'cpu_seconds': round(time.process_time(), 3),
+            'max_rss_mb': round(max_rss_mb(), 1),
+            'max_rss_children_mb': round(max_rss_mb(resource.RUSAGE_CHILDREN), 1),
+            'stages': {name: {key: round(value, 3) if isinstance(value, float) else value for key, value in totals.items()}
+                       for name, totals in _stages.items()},
+            'hit_ratios': _hit_ratios(),
+            'counters': [{'name': name, 'labels': dict(labels), 'value': value}
+                         for (name, labels), value in sorted(_counters.items())],
+            'histograms': [{'name': name, 'labels': dict(labels), 'count': histogram['count'],
+                            'sum': round(histogram['sum'], 3),
+                            'buckets': dict(zip([str(bound) for bound in BUCKETS], histogram['buckets']))}
+                           for (name, labels), histogram in sorted(_histograms.items())],
+        }
+
+def write_report(name):
+    """
+    Write the metrics of this run to <name>.metrics.json.
+    """
+    path = f"{name}.metrics.json"
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(snapshot(), f, indent=2, ensure_ascii=False)
+    print(f"Run report saved to {path}")
+
+def report_at_exit(name):
+    """
+    Write the run report when the script exits.
+    """
+    atexit.register(write_report, name)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in pairs) + '}'
+
+def prometheus_text(prefix='suru_', gauges=None):
+    """
+    The metrics in Prometheus text format. gauges adds current values such as
+    queue sizes, as {name: [(labels dict, value)]}.
+    """
+    lines = []
+    with _lock:
+        counters = sorted(_counters.items())
+        histograms = sorted(_histograms.items())
+        stages = {name: dict(totals) for name, totals in _stages.items()}
+
+    typed = set()
+    for (name, labels), value in counters:
+        metric = f"{prefix}{name}_total"
+        if metric not in typed:
+            lines.append(f"# TYPE {metric} counter")
+            typed.add(metric)
+        lines.append(f"{metric}{_format_labels(labels)} {value}")
+
+    for (name, labels), histogram in histograms:
+        metric = f"{prefix}{name}_seconds"
+        if metric not in typed:
+            lines.append(f"# TYPE {metric} histogram")
+            typed.add(metric)
+        cumulative = 0
+        for bound, count in zip(BUCKETS, histogram['buckets']):
+            cumulative += count
+            le = '+Inf' if bound == float('inf') else str(bound)
+            lines.append(f"{metric}_bucket{_format_labels(labels, [('le', le)])} {cumulative}")
+        lines.append(f"{metric}_sum{_format_labels(labels)} {histogram['sum']}")
+        lines.append(f"{metric}_count{_format_labels(labels)} {histogram['count']}")
+
+    if stages:
+        lines.append(f"# TYPE {prefix}stage_seconds_total counter")
+        for name, totals in stages.items():
+            for kind in ['wall', 'cpu']:
+                lines.append(f"{prefix}stage_seconds_total{_format_labels([('stage', name), ('kind', kind)])} "
+                             f"{totals[f'{kind}_seconds']}")
+
+    lines.append(f"# TYPE {prefix}process_max_rss_bytes gauge")
+    lines.append(f"{prefix}process_max_rss_bytes {int(max_rss_mb() * 1024 * 1024)}")
+    for name, values in (gauges or {}).items():
+        lines.append(f"# TYPE {prefix}{name} gauge")
+        for labels, value in values:
+            lines.append(f"{prefix}{name}{_format_labels(sorted(labels.items()))} {value}")
+    return '\n'.join(lines) + '\n'
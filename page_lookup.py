@@ -0,0 +1,145 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import wikidata_api
+
+SITELINKS_BATCH = 50
+
+executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='page')
+
+def finnish_lexeme_query(suru_id):
+    """
+    Finnish lexemes with the SuRu ID, their senses, P5137 items and the Swedish
+    lexemes with senses for the same items (as in the extension).
+    """
+    return f"""
+SELECT DISTINCT ?lexeme ?lemma ?sense ?gloss_sv ?item ?itemLabel ?itemDescription ?lexeme_sv ?lemma_sv ?gloss_sv_fi WHERE {{
+  ?lexeme dct:language wd:Q1412 ;
+          wikibase:lemma ?lemma ;
+          wdt:P12682 {wikidata_api.sparql_literal(suru_id)} .
+  OPTIONAL {{ ?lexeme ontolex:sense ?sense . }}
+  OPTIONAL {{
+    ?sense skos:definition ?gloss_sv .
+    FILTER(LANG(?gloss_sv) = "sv")
+  }}
+  OPTIONAL {{
+    ?sense wdt:P5137 ?item .
+    OPTIONAL {{
+      ?item rdfs:label ?itemLabel .
+      FILTER(LANG(?itemLabel) = "sv")
+    }}
+    OPTIONAL {{
+      ?item schema:description ?itemDescription .
+      FILTER(LANG(?itemDescription) = "sv")
+    }}
+  }}
+  OPTIONAL {{
+    ?sense wdt:P5137 ?item .
+    ?sense_sv wdt:P5137 ?item .
+    ?lexeme_sv ontolex:sense ?sense_sv ;
+               dct:language wd:Q9027 ;
+               wikibase:lemma ?lemma_sv .
+    OPTIONAL {{
+      ?sense_sv skos:definition ?gloss_sv_fi .
+      FILTER(LANG(?gloss_sv_fi) = "fi")
+    }}
+  }}
+}}"""
+
+def swedish_lexemes_query(words):
+    """
+    Swedish noun lexemes of all the words in one query, with their senses,
+    Finnish glosses and P5137 items with Swedish labels.
+    """
+    values = ' '.join(wikidata_api.sparql_literal(word, 'sv') for word in words)
+    return f"""
+SELECT DISTINCT ?lexeme ?lemma ?sense ?gloss_fi ?item ?item_sv WHERE {{
+  VALUES ?lemma {{ {values} }}
+  ?lexeme dct:language wd:Q9027 ;
+          wikibase:lemma ?lemma ;
+          wikibase:lexicalCategory wd:Q1084 .
+  OPTIONAL {{
+    ?lexeme ontolex:sense ?sense .
+    OPTIONAL {{
+      ?sense skos:definition ?gloss_fi .
+      FILTER(LANG(?gloss_fi) = "fi")
+    }}
+    OPTIONAL {{
+      ?sense wdt:P5137 ?item .
+      ?item rdfs:label ?item_sv .
+      FILTER(LANG(?item_sv) = "sv")
+    }}
+  }}
+}}"""
+
+def flatten(bindings):
+    # SPARQL bindings as plain {variable: value} rows
+    return [{name: value['value'] for name, value in binding.items()} for binding in bindings]
+
+def trim_sitelinks(entity):
+    """
+    Swedish, Finnish and English Wikipedia links of an entity and the number of other sitelinks.
+    """
+    sitelinks = entity.get('sitelinks', {})
+    result = {}
+    for lang in ['sv', 'fi', 'en']:
+        link = sitelinks.get(f'{lang}wiki')
+        result[lang] = {'title': link['title'], 'url': link['url']} if link else None
+    result['otherCount'] = len([site for site in sitelinks if site not in ('svwiki', 'fiwiki', 'enwiki')])
+    return result
+
+def fetch_sitelinks(qids):
+    """
+    Trimmed sitelinks of the items, SITELINKS_BATCH ids per wbgetentities
+    request with the batches fetched concurrently. Returns them in qids order.
+    """
+    def fetch_batch(batch):
+        params = {'action': 'wbgetentities', 'ids': '|'.join(batch), 'props': 'sitelinks/urls', 'format': 'json'}
+        return wikidata_api.fetch_json(wikidata_api.API_URL, params).get('entities', {})
+
+    batches = [qids[start:start + SITELINKS_BATCH] for start in range(0, len(qids), SITELINKS_BATCH)]
+    entities = {}
+    for batch_entities in executor.map(fetch_batch, batches):
+        entities.update(batch_entities)
+    return [trim_sitelinks(entities.get(qid, {})) for qid in qids]
+
+def cached_sitelinks(proxy, qids):
+    """
+    Sitelinks of the items from the proxy cache, fetching the missing ones in batches.
+    """
+    qids = list(dict.fromkeys(qids))
+    params_list = [{'sitelinks': qid} for qid in qids]
+    results = proxy.get_many(wikidata_api.API_URL, params_list,
+                             lambda missing: fetch_sitelinks([params['sitelinks'] for params in missing]))
+    return dict(zip(qids, results))
+
+def cached_sparql(proxy, query):
+    params = {'query': query, 'format': 'json'}
+    data = proxy.get(wikidata_api.SPARQL_URL, params,
+                     lambda: wikidata_api.fetch_json(wikidata_api.SPARQL_URL, params, method='POST'))
+    return data['results']['bindings']
+
+def lookup_page(proxy, suru_id, words):
+    """
+    Everything the extension shows for one Kotus page: the Finnish lexemes with
+    the SuRu ID, the Swedish lexemes of the translation words and sitelinks of
+    all their P5137 items. The two SPARQL queries run concurrently, then the
+    sitelinks are fetched in batches.
+    """
+    words = list(dict.fromkeys(word for word in words if word))
+    finnish = executor.submit(cached_sparql, proxy, finnish_lexeme_query(suru_id)) if suru_id else None
+    swedish = executor.submit(cached_sparql, proxy, swedish_lexemes_query(words)) if words else None
+
+    lexemes = flatten(finnish.result()) if finnish else []
+    translations = {word: [] for word in words}
+    for row in flatten(swedish.result()) if swedish else []:
+        translations.setdefault(row['lemma'], []).append(row)
+
+    items = [row['item'].rsplit('/', 1)[-1] for row in lexemes if row.get('item') and row.get('itemLabel')]
+    items += [row['item'].rsplit('/', 1)[-1] for rows in translations.values() for row in rows
+              if row.get('item') and row.get('item_sv')]
+    return {
+        'suru_id': suru_id,
+        'lexemes': lexemes,
+        'translations': translations,
+        'sitelinks': cached_sitelinks(proxy, items) if items else {},
+    }
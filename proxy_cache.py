@@ -0,0 +1,113 @@
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+from wikidata_api import ResponseCache
+
+class ProxyCache:
+    """
+    Two-level cache for the browser extension's Wikidata requests: an in-memory
+    LRU in front of the on-disk ResponseCache. Responses younger than ttl are
+    served as they are. Older ones, up to ttl + stale seconds, are served at once
+    while a background thread fetches a fresh copy (stale-while-revalidate).
+    """
+    def __init__(self, path='07_proxy_cache.sqlite', ttl=24 * 3600, stale=7 * 24 * 3600, max_entries=10000):
+        self.ttl = ttl
+        self.stale = stale
+        self.max_entries = max_entries
+        self.disk = ResponseCache(path, ttl=ttl + stale)
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def _remember(self, key, data, fetched):
+        with self._lock:
+            self._memory[key] = (data, fetched)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _lookup(self, url, params):
+        key = ResponseCache.make_key(url, params)
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                return entry
+        data, age = self.disk.get_with_age(url, params)
+        if data is None:
+            return None
+        entry = (data, time.time() - age)
+        self._remember(key, *entry)
+        return entry
+
+    def _store(self, url, params, data):
+        self.disk.put(url, params, data)
+        self._remember(ResponseCache.make_key(url, params), data, time.time())
+
+    def _refresh(self, url, params_list, fetch_many, keys):
+        try:
+            for params, data in zip(params_list, fetch_many(params_list)):
+                self._store(url, params, data)
+        except Exception as e:
+            print(f"Refreshing {len(keys)} cached responses failed: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.difference_update(keys)
+
+    def get(self, url, params, fetch):
+        """
+        Cached response for url and params; fetch() is called for a fresh one.
+        """
+        return self.get_many(url, [params], lambda params_list: [fetch()])[0]
+
+    def get_many(self, url, params_list, fetch_many):
+        """
+        Cached responses for several requests. fetch_many(params_list) is called
+        once for the requests not in the cache (and once in the background for
+        stale ones) and returns their responses in the same order.
+        """
+        results = [None] * len(params_list)
+        missing = []
+        stale = {}
+        for i, params in enumerate(params_list):
+            entry = self._lookup(url, params)
+            if entry is not None:
+                data, fetched = entry
+                age = time.time() - fetched
+                if age <= self.ttl:
+                    self.hits += 1
+                    metrics.inc('proxy_cache_lookups', result='hit')
+                    results[i] = data
+                    continue
+                if age <= self.ttl + self.stale:
+                    self.stale_hits += 1
+                    metrics.inc('proxy_cache_lookups', result='stale')
+                    stale[ResponseCache.make_key(url, params)] = params
+                    results[i] = data
+                    continue
+            missing.append(i)
+
+        if stale:
+            with self._lock:
+                keys = [key for key in stale if key not in self._refreshing]
+                self._refreshing.update(keys)
+            if keys:
+                threading.Thread(target=self._refresh, args=(url, [stale[key] for key in keys], fetch_many, keys),
+                                 daemon=True).start()
+
+        if missing:
+            self.misses += len(missing)
+            metrics.inc('proxy_cache_lookups', len(missing), result='miss')
+            fresh = fetch_many([params_list[i] for i in missing])
+            for i, data in zip(missing, fresh):
+                self._store(url, params_list[i], data)
+                results[i] = data
+        return results
+
+    def stats(self):
+        return {'hits': self.hits, 'stale_hits': self.stale_hits, 'misses': self.misses, 'memory_entries': len(self._memory)}
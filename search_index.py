@@ -0,0 +1,193 @@
+import argparse
+import bisect
+import os
+import time
+import zlib
+
+import numpy as np
+
+import entry_store
+from translation_index import normalize_term
+
+DEFAULT_PATH = 'search_index.bin'
+
+# Searchable terms: Finnish headwords and Swedish translations
+LANGUAGES = ['fi', 'sv']
+
+# Entries listed per matching term; common Swedish words translate hundreds of headwords
+MAX_ENTRIES = 50
+
+def entry_terms(headword, translations, sense_groups):
+    """
+    Normalized terms of one entry by language.
+    """
+    sv_texts = list(translations if translations is not None else [])
+    for texts in (sense_groups if sense_groups is not None else []):
+        sv_texts.extend(texts)
+    terms = {'fi': {normalize_term(headword)} if isinstance(headword, str) else set(),
+             'sv': {normalize_term(text) for text in sv_texts if isinstance(text, str)}}
+    return {language: {term for term in language_terms if term} for language, language_terms in terms.items()}
+
+def trigrams(term):
+    """
+    Hashes of the character trigrams of a term, padded so the start and end of the word count.
+    """
+    padded = f"  {term} "
+    return {zlib.crc32(padded[i:i + 3].encode('utf-8')) for i in range(len(padded) - 2)}
+
+def edit_distance(a, b, limit):
+    """
+    Levenshtein distance of a and b, or limit + 1 if it is larger than limit.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, start=1):
+        current = [i]
+        for j, char_b in enumerate(b, start=1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+def language_arrays(language, term_rows):
+    """
+    Arrays of one language: the terms sorted by UTF-8 bytes (which is code point
+    order) with the entry rows of each term, and a trigram index over the terms.
+    """
+    terms = sorted(term_rows, key=lambda term: term.encode('utf-8'))
+    encoded = [term.encode('utf-8') for term in terms]
+    offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    np.cumsum([len(data) for data in encoded], out=offsets[1:])
+    row_offsets = np.zeros(len(terms) + 1, dtype=np.int32)
+    np.cumsum([len(term_rows[term]) for term in terms], out=row_offsets[1:])
+    rows = np.fromiter((row for term in terms for row in term_rows[term]), dtype=np.int32, count=int(row_offsets[-1]))
+
+    pairs = [(gram, term_id) for term_id, term in enumerate(terms) for gram in trigrams(term)]
+    grams = np.fromiter((gram for gram, _ in pairs), dtype=np.uint32, count=len(pairs))
+    gram_terms = np.fromiter((term_id for _, term_id in pairs), dtype=np.int32, count=len(pairs))
+    order = np.argsort(grams, kind='stable')
+    grams, gram_terms = grams[order], gram_terms[order]
+    gram_keys, gram_starts = np.unique(grams, return_index=True)
+    gram_offsets = np.append(gram_starts, len(grams)).astype(np.int32)
+    return {
+        f'{language}_terms': np.frombuffer(b''.join(encoded), dtype=np.uint8),
+        f'{language}_term_offsets': offsets,
+        f'{language}_rows': rows,
+        f'{language}_row_offsets': row_offsets,
+        f'{language}_gram_keys': gram_keys.astype(np.uint32),
+        f'{language}_gram_offsets': gram_offsets,
+        f'{language}_gram_terms': gram_terms,
+    }
+
+def build_index(df, path=DEFAULT_PATH):
+    """
+    Build the search index from a table with headword, translations and
+    sense_groups columns. Results refer to rows of the entry store built from
+    the same table.
+    """
+    start = time.perf_counter()
+    term_rows = {language: {} for language in LANGUAGES}
+    for row, values in enumerate(zip(df['headword'], df['translations'], df['sense_groups'])):
+        for language, terms in entry_terms(*values).items():
+            for term in terms:
+                term_rows[language].setdefault(term, []).append(row)
+    arrays = {}
+    for language in LANGUAGES:
+        arrays.update(language_arrays(language, term_rows[language]))
+    entry_store.write_arrays(path, arrays, entries=len(df))
+    counts = ', '.join(f"{len(term_rows[language])} {language}" for language in LANGUAGES)
+    print(f"Indexed {counts} terms of {len(df)} entries in {time.perf_counter() - start:.1f}s: {path}")
+
+class _Terms:
+    # Sorted terms of one language as a sequence for bisect, decoded on access
+    def __init__(self, data, offsets):
+        self._data = data
+        self._offsets = offsets
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        return self._data[self._offsets[i]:self._offsets[i + 1]].tobytes()
+
+class SearchIndex:
+    """
+    Prefix and fuzzy search over the SuRu headwords (fi) and Swedish
+    translations (sv) of an index built with build_index, resolved to entries
+    with the entry store. Both files are memory-mapped.
+    """
+    def __init__(self, store, path=DEFAULT_PATH):
+        header, self._arrays = entry_store.read_arrays(path)
+        if header['entries'] != len(store):
+            raise ValueError(f"{path} has {header['entries']} entries but the entry store {len(store)}, "
+                             f"rebuild both with 03_suru_xlsx.py")
+        self._store = store
+        self._terms = {language: _Terms(self._arrays[f'{language}_terms'], self._arrays[f'{language}_term_offsets'])
+                       for language in LANGUAGES}
+
+    def _match(self, language, term_id, distance=0):
+        offsets = self._arrays[f'{language}_row_offsets']
+        rows = self._arrays[f'{language}_rows'][offsets[term_id]:offsets[term_id + 1]]
+        return {'term': self._terms[language][term_id].decode('utf-8'), 'distance': distance,
+                'entry_count': len(rows), 'entries': [self._store.headline(int(row)) for row in rows[:MAX_ENTRIES]]}
+
+    def prefix(self, text, language='fi', limit=20):
+        """
+        Terms starting with text in sorted order, each with its entries.
+        """
+        prefix = normalize_term(text).encode('utf-8')
+        terms = self._terms[language]
+        matches = []
+        for term_id in range(bisect.bisect_left(terms, prefix), len(terms)):
+            if len(matches) == limit or not terms[term_id].startswith(prefix):
+                break
+            matches.append(self._match(language, term_id))
+        return matches
+
+    def fuzzy(self, text, language='fi', max_distance=2, limit=20):
+        """
+        Terms within max_distance edits of text, closest first, each with its entries.
+        Candidates share enough trigrams with text; one edit changes at most three.
+        """
+        term = normalize_term(text)
+        grams = trigrams(term)
+        keys = self._arrays[f'{language}_gram_keys']
+        offsets = self._arrays[f'{language}_gram_offsets']
+        gram_terms = self._arrays[f'{language}_gram_terms']
+        postings = []
+        for gram in grams:
+            i = int(np.searchsorted(keys, gram))
+            if i < len(keys) and keys[i] == gram:
+                postings.append(gram_terms[offsets[i]:offsets[i + 1]])
+        if not postings:
+            return []
+        candidates, shared = np.unique(np.concatenate(postings), return_counts=True)
+        candidates = candidates[shared >= len(grams) - 3 * max_distance]
+
+        matches = []
+        for term_id in candidates:
+            candidate = self._terms[language][int(term_id)].decode('utf-8')
+            distance = edit_distance(term, candidate, max_distance)
+            if distance <= max_distance:
+                matches.append((distance, candidate, int(term_id)))
+        return [self._match(language, term_id, distance) for distance, _, term_id in sorted(matches)[:limit]]
+
+def open_index(store, path=DEFAULT_PATH):
+    """
+    The search index at path over the entry store, or None if either has not been built.
+    """
+    if store is None or not os.path.exists(path):
+        return None
+    return SearchIndex(store, path)
+
+if __name__ == "__main__":
+    # Imported here so the Flask server does not load pandas
+    from suru_store import read_table
+
+    parser = argparse.ArgumentParser(description="Build the headword and translation search index from the output of step 3")
+    parser.add_argument('--input', default='03_suru', help='Extracted SuRu table (default: 03_suru)')
+    parser.add_argument('--output', default=DEFAULT_PATH, help=f'Index file (default: {DEFAULT_PATH})')
+    args = parser.parse_args()
+    build_index(read_table(args.input, columns=['headword', 'translations', 'sense_groups']), args.output)
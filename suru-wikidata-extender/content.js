@@ -1,6 +1,72 @@
 // SURU Wikidata Extension - Content Script
 console.log('=== SURU Extension: Content script loaded ===');
 
+// Local Flask server (07_create_lex_flask.py), which caches Wikidata requests
+const FLASK_URL = 'http://localhost:5001';
+
+// Function to fetch from the local Flask server, returns null if it is not running or fails
+async function fetchFromFlask(path, options = {}) {
+    try {
+        const response = await fetch(FLASK_URL + path, options);
+        if (response.ok) {
+            return response;
+        }
+        console.error('Flask proxy request failed:', path, response.status);
+    } catch (error) {
+        console.log('Flask proxy not available, using Wikidata directly');
+    }
+    return null;
+}
+
+// Function to POST a SPARQL query, through the Flask proxy cache when available
+async function fetchSparql(body) {
+    const proxied = await fetchFromFlask('/proxy/sparql', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/x-www-form-urlencoded' },
+        body: body
+    });
+    if (proxied) {
+        return proxied;
+    }
+    return fetch('https://query.wikidata.org/sparql', {
+        method: 'POST',
+        headers: {
+            'Accept': 'application/sparql-results+json',
+            'Content-Type': 'application/x-www-form-urlencoded'
+        },
+        body: body
+    });
+}
+
+// Function to fetch everything for the page from the Flask server in one request, null without the server
+async function fetchPage(suruId, vastineWords) {
+    const params = new URLSearchParams();
+    if (suruId) {
+        params.append('suru_id', suruId);
+    }
+    vastineWords.forEach(word => params.append('words', word.word));
+    const response = await fetchFromFlask(`/page?${params}`);
+    if (!response) {
+        return null;
+    }
+    return await response.json();
+}
+
+// Function to get sitelinks, from the /page response when available
+async function getSitelinks(qCode, sitelinksByItem) {
+    if (sitelinksByItem) {
+        return sitelinksByItem[qCode] || null;
+    }
+    return await fetchSitelinks(qCode);
+}
+
+// Function to turn SPARQL bindings into plain rows like the /page response
+function flattenBindings(bindings) {
+    return bindings.map(binding => Object.fromEntries(
+        Object.entries(binding).map(([name, value]) => [name, value.value])
+    ));
+}
+
 // Function to create the content container
 function createContentContainer() {
     const container = document.createElement('div');
@@ -114,22 +180,13 @@ async function searchSwedishLexemes(word) {
     }
     }`;
 
-    const url = 'https://query.wikidata.org/sparql';
-    const headers = {
-        'Accept': 'application/sparql-results+json',
-        'Content-Type': 'application/x-www-form-urlencoded'
-    };
     const body = new URLSearchParams({
         'query': sparqlQuery,
         'format': 'json'
     });
 
     try {
-        const response = await fetch(url, {
-            method: 'POST',
-            headers: headers,
-            body: body
-        });
+        const response = await fetchSparql(body);
         
         if (!response.ok) {
             console.error('SPARQL query failed:', response.status, response.statusText);
@@ -142,14 +199,7 @@ async function searchSwedishLexemes(word) {
         }
 
         // Return all bindings instead of just the first one
-        return data.results.bindings.map(binding => ({
-            lexeme: binding.lexeme.value,
-            lemma: binding.lemma.value,
-            sense: binding.sense?.value || '',
-            gloss_fi: binding.gloss_fi?.value || '',
-            item: binding.item?.value || '',
-            item_sv: binding.item_sv?.value || ''
-        }));
+        return flattenBindings(data.results.bindings);
     } catch (error) {
         console.error('Error executing SPARQL query:', error);
         return [];
@@ -216,11 +266,6 @@ async function executeSparqlQuery(suruId) {
 
     console.log('SPARQL Query:', sparqlQuery);
 
-    const url = 'https://query.wikidata.org/sparql';
-    const headers = {
-        'Accept': 'application/sparql-results+json',
-        'Content-Type': 'application/x-www-form-urlencoded'
-    };
     const body = new URLSearchParams({
         'query': sparqlQuery,
         'format': 'json'
@@ -228,11 +273,7 @@ async function executeSparqlQuery(suruId) {
 
     try {
         console.log('Sending request to Wikidata...');
-        const response = await fetch(url, {
-            method: 'POST',
-            headers: headers,
-            body: body
-        });
+        const response = await fetchSparql(body);
         
         if (!response.ok) {
             console.error('SPARQL query failed:', response.status, response.statusText);
@@ -257,20 +298,17 @@ async function executeSparqlQuery(suruId) {
     }
 }
 
-// Function to create translation table
-async function createTranslationTable() {
-    // Collect vastine words
-    const vastineWords = collectVastineWords();
-    console.log('Collected vastine words:', vastineWords);
-
+// Function to create translation table, from the /page response when available
+async function createTranslationTable(vastineWords, page = null) {
     if (vastineWords.length === 0) {
         return '';
     }
 
     // Search for Swedish lexemes for each vastine word
-    const translationResults = await Promise.all(
-        vastineWords.map(word => searchSwedishLexemes(word.word))
-    );
+    const translationResults = page
+        ? vastineWords.map(word => page.translations[word.word] || [])
+        : await Promise.all(vastineWords.map(word => searchSwedishLexemes(word.word)));
+    const sitelinksByItem = page ? page.sitelinks : null;
 
     let content = `
         <div class="suru-table-container">
@@ -323,7 +361,7 @@ async function createTranslationTable() {
                     const qCode = result.item.split('/').pop();
                     
                     // Fetch sitelinks for this P5137 object
-                    const sitelinks = await fetchSitelinks(qCode);
+                    const sitelinks = await getSitelinks(qCode, sitelinksByItem);
                     let sitelinksHTML = '';
                     if (sitelinks) {
                         sitelinksHTML = createSitelinksHTML(sitelinks);
@@ -371,16 +409,10 @@ async function createTranslationTable() {
     return content;
 }
 
-// Function to create table from SPARQL results
-async function createTable(results) {
-    console.log('Creating table from results:', results);
-    
-    if (!results || !results.results || !results.results.bindings) {
-        console.error('Invalid results format:', results);
-        return '<div class="suru-error">No results found or invalid response format</div>';
-    }
-
-    const bindings = results.results.bindings;
+// Function to create table from lexeme rows (flattened SPARQL results or the /page response)
+async function createTable(rows, sitelinksByItem = null) {
+    console.log('Creating table from rows:', rows);
+    const bindings = rows;
     console.log('Number of bindings:', bindings.length);
     
     if (bindings.length === 0) {
@@ -420,13 +452,13 @@ async function createTable(results) {
         const binding = bindings[index];
         console.log(`Processing binding ${index}:`, binding);
         
-        const lexeme = binding.lexeme?.value || '';
-        const lemma = binding.lemma?.value || '';
-        const sense = binding.sense?.value || '';
-        const item = binding.item?.value || '';
-        const itemLabel = binding.itemLabel?.value || '';
-        const lexeme_sv = binding.lexeme_sv?.value || '';
-        const lemma_sv = binding.lemma_sv?.value || '';
+        const lexeme = binding.lexeme || '';
+        const lemma = binding.lemma || '';
+        const sense = binding.sense || '';
+        const item = binding.item || '';
+        const itemLabel = binding.itemLabel || '';
+        const lexeme_sv = binding.lexeme_sv || '';
+        const lemma_sv = binding.lemma_sv || '';
 
         // Extract L-codes and S-codes
         const lCode = lexeme.split('/').pop();
@@ -442,7 +474,7 @@ async function createTable(results) {
         let p5137Cell = '';
         if (item && itemLabel) {
             // Fetch sitelinks for this P5137 object
-            const sitelinks = await fetchSitelinks(qCode);
+            const sitelinks = await getSitelinks(qCode, sitelinksByItem);
             let sitelinksHTML = '';
             if (sitelinks) {
                 sitelinksHTML = createSitelinksHTML(sitelinks);
@@ -471,6 +503,12 @@ async function createTable(results) {
 // Function to fetch sitelinks from Wikidata API
 async function fetchSitelinks(qCode) {
     if (!qCode) return null;
+
+    // The Flask proxy returns the sitelinks already trimmed to this format
+    const proxied = await fetchFromFlask(`/proxy/sitelinks/${qCode}`);
+    if (proxied) {
+        return await proxied.json();
+    }
     
     try {
         const url = `https://www.wikidata.org/wiki/Special:EntityData/${qCode}.json`;
@@ -606,28 +644,39 @@ async function initWidget() {
 
         let content = '';
 
+        // Remove 'SURU_' prefix if present
+        if (suruId && suruId.startsWith('SURU_')) {
+            suruId = suruId.substring(5);
+            console.log('Removed SURU_ prefix, new suru_id:', suruId);
+        }
+
+        // Collect vastine words
+        const vastineWords = collectVastineWords();
+        console.log('Collected vastine words:', vastineWords);
+
+        // One request to the Flask server for the whole page, otherwise query Wikidata directly
+        const page = await fetchPage(suruId, vastineWords);
+
         // Handle suru_id results if present
         if (suruId) {
-            // Remove 'SURU_' prefix if present
-            if (suruId.startsWith('SURU_')) {
-                suruId = suruId.substring(5);
-                console.log('Removed SURU_ prefix, new suru_id:', suruId);
-            }
-
-            // Execute SPARQL query and display results
-            console.log('Executing SPARQL query...');
-            const results = await executeSparqlQuery(suruId);
-            
-            if (!results) {
-                content += '<div class="suru-error">Error fetching data from Wikidata</div>';
+            if (page) {
+                content += await createTable(page.lexemes, page.sitelinks);
             } else {
-                content += await createTable(results);
+                // Execute SPARQL query and display results
+                console.log('Executing SPARQL query...');
+                const results = await executeSparqlQuery(suruId);
+                
+                if (!results) {
+                    content += '<div class="suru-error">Error fetching data from Wikidata</div>';
+                } else {
+                    content += await createTable(flattenBindings(results.results.bindings));
+                }
             }
         }
 
         // Add translation table
         console.log('Creating translation table...');
-        content += await createTranslationTable();
+        content += await createTranslationTable(vastineWords, page);
 
         console.log('Setting container innerHTML...');
         container.innerHTML = content;
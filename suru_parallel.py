@@ -0,0 +1,74 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+def add_jobs_argument(parser):
+    """
+    Add the shared --jobs option to an argparse parser.
+    """
+    parser.add_argument('--jobs', '-j', type=int, default=1,
+                        help='Number of worker processes, 0 for one per CPU (default: 1, serial)')
+
+def _timed_call(func, path):
+    start = time.perf_counter()
+    result = func(path)
+    return result, time.perf_counter() - start
+
+def _print_summary(files, start, busy, jobs):
+    wall = time.perf_counter() - start
+    print(f"Timing: {len(files)} files in {wall:.2f}s wall, {busy:.2f}s in workers, jobs={max(jobs, 1)}")
+
+def stream_files(func, files):
+    """
+    Serial counterpart of map_files for a generator func(path): yield its items
+    file by file in sorted filename order, without holding a whole file's results.
+    Prints the same timings as map_files; time spent by the consumer between
+    items is not counted for the file.
+    """
+    files = sorted(files)
+    start = time.perf_counter()
+    busy = 0.0
+    for path in files:
+        elapsed = 0.0
+        items = func(path)
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(items)
+            except StopIteration:
+                break
+            finally:
+                elapsed += time.perf_counter() - started
+            yield item
+        busy += elapsed
+        print(f"Timing: {os.path.basename(path)} {elapsed:.2f}s")
+    _print_summary(files, start, busy, 1)
+
+def map_files(func, files, jobs=1):
+    """
+    Run func(path) for every file and yield (path, result) in sorted filename order.
+    With jobs > 1 the files are fanned out to worker processes; results are still
+    merged back in sorted order so the output is identical to the serial path.
+    func must be a module level function (or a functools.partial of one).
+    """
+    files = sorted(files)
+    if jobs == 0:
+        jobs = os.cpu_count() or 1
+
+    start = time.perf_counter()
+    busy = 0.0
+    if jobs <= 1:
+        for path in files:
+            result, elapsed = _timed_call(func, path)
+            busy += elapsed
+            print(f"Timing: {os.path.basename(path)} {elapsed:.2f}s")
+            yield path, result
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            results = executor.map(_timed_call, [func] * len(files), files)
+            for path, (result, elapsed) in zip(files, results):
+                busy += elapsed
+                print(f"Timing: {os.path.basename(path)} {elapsed:.2f}s")
+                yield path, result
+
+    _print_summary(files, start, busy, jobs)
@@ -0,0 +1,123 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+def table_path(name):
+    return f"{name}.parquet"
+
+def add_xlsx_argument(parser):
+    """
+    Add the shared --xlsx option to an argparse parser.
+    """
+    parser.add_argument('--xlsx', action='store_true',
+                        help='Also export the output table to xlsx for human review')
+
+def write_table(df, name):
+    """
+    Save a step's output as typed Parquet. List columns are stored as real lists.
+    """
+    path = table_path(name)
+    df.to_parquet(path, index=False)
+    print(f"Output saved to {path}")
+
+def read_table(name, columns=None):
+    """
+    Read a step's output, optionally only the given columns.
+    List columns come back as Python lists.
+    """
+    df = pd.read_parquet(table_path(name), columns=columns)
+    for column in df.columns:
+        if df[column].dtype == object:
+            df[column] = df[column].map(_to_list)
+    return df
+
+def table_columns(name):
+    """
+    Column names of a step's output, without reading the data.
+    """
+    return pq.read_schema(table_path(name)).names
+
+def read_previous(name, columns=None):
+    """
+    A step's previous output for an incremental run, optionally only the given
+    columns. None if there is none or it has no content_hash column.
+    """
+    path = table_path(name)
+    if not os.path.exists(path) or 'content_hash' not in table_columns(name):
+        return None
+    return read_table(name, columns)
+
+def change_set(df, previous):
+    """
+    Entries added, modified or removed in df compared to previous, by suru_id and content_hash.
+    """
+    old = dict(zip(previous['suru_id'], previous['content_hash']))
+    new = dict(zip(df['suru_id'], df['content_hash']))
+    changes = [(suru_id, 'added') for suru_id in new if suru_id not in old]
+    changes += [(suru_id, 'modified') for suru_id, content_hash in new.items()
+                if suru_id in old and old[suru_id] != content_hash]
+    changes += [(suru_id, 'removed') for suru_id in old if suru_id not in new]
+    return pd.DataFrame(changes, columns=['suru_id', 'change'])
+
+def _entry_keys(df, columns):
+    keys = df['suru_id'] + '|' + df['content_hash']
+    for column in columns:
+        keys = keys + '|' + df[column].astype(str)
+    return keys
+
+def split_changed(df, previous, columns=()):
+    """
+    Split an incremental run: the rows of df whose entry (or value in one of
+    columns) is new or changed since previous, and the rows of previous that
+    can be kept as they are.
+    """
+    current = _entry_keys(df, columns)
+    done = _entry_keys(previous, columns)
+    return df[~current.isin(set(done))], previous[done.isin(set(current))]
+
+def combine(df, kept, processed):
+    """
+    Kept and newly processed rows of an incremental run, in the entry order of df.
+    """
+    position = pd.Series(range(len(df)), index=df['suru_id']).groupby(level=0).first()
+    combined = pd.concat([kept, processed], ignore_index=True)
+    order = combined['suru_id'].map(position).sort_values(kind='stable').index
+    return combined.loc[order].reset_index(drop=True)
+
+def print_incremental(kept, processed, name):
+    print(f"Incremental run: {processed} new or changed rows to process, {kept} kept from {table_path(name)}")
+
+def _to_list(value):
+    if isinstance(value, np.ndarray):
+        return [_to_list(v) for v in value]
+    return value
+
+def _flatten(value):
+    for item in value:
+        if isinstance(item, (list, np.ndarray)):
+            yield from _flatten(item)
+        elif isinstance(item, dict):
+            yield json.dumps(item, ensure_ascii=False)
+        else:
+            yield str(item)
+
+def _xlsx_cell(value):
+    if isinstance(value, (list, np.ndarray)):
+        return '; '.join(_flatten(value))
+    if isinstance(value, dict):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+def export_xlsx(df, name):
+    """
+    Export a table to xlsx for human review. List columns are joined with '; '.
+    """
+    path = f"{name}.xlsx"
+    df = df.copy()
+    for column in df.columns:
+        if df[column].dtype == object:
+            df[column] = df[column].map(_xlsx_cell)
+    df.to_excel(path, index=False)
+    print(f"Exported to {path}")
@@ -0,0 +1,21 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from word_categories import normalize_key
+
+def test_homonym_numbers_removed():
+    assert normalize_key('kuusi¹') == 'kuusi'
+    assert normalize_key('¹kuusi') == 'kuusi'
+    assert normalize_key('kuusi (2)') == 'kuusi'
+    assert normalize_key(' kuusi  ') == 'kuusi'
+
+def test_plain_digits_kept():
+    assert normalize_key('B12') == 'B12'
+    assert normalize_key('K18') == 'K18'
+    assert normalize_key('a4') == 'a4'
+    assert normalize_key('100 metrin juoksu') == '100 metrin juoksu'
+
+def test_not_a_word():
+    assert normalize_key(None) is None
@@ -0,0 +1,98 @@
+import argparse
+import os
+import sqlite3
+import time
+import unicodedata
+
+DEFAULT_PATH = 'translation_index.sqlite'
+
+def normalize_term(text):
+    """
+    Lookup key of a Swedish term: NFC, lower case, whitespace collapsed,
+    without | syllable marks and a trailing semicolon (as on the Kotus pages).
+    """
+    text = unicodedata.normalize('NFC', text).replace('|', '')
+    return ' '.join(text.split()).rstrip(';').strip().casefold()
+
+def index_rows(suru_id, headword, translations, sense_groups):
+    """
+    Index rows of one entry: (term, text, suru_id, headword, sense group, position).
+    Sense group 0 holds the translations, n the Translation texts of the nth SenseGrp;
+    positions count from 1 within each group.
+    """
+    groups = [translations or []] + list(sense_groups or [])
+    for group, texts in enumerate(groups):
+        for position, text in enumerate(texts, start=1):
+            term = normalize_term(text) if text else ''
+            if term:
+                yield (term, text.strip(), suru_id, headword, group, position)
+
+def build_index(df, index_path=DEFAULT_PATH):
+    """
+    Build the index from a table with suru_id, headword, translations and sense_groups columns.
+    """
+    start = time.perf_counter()
+    tmp_path = index_path + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    db = sqlite3.connect(tmp_path)
+    db.execute("""
+        CREATE TABLE translations (
+            term TEXT NOT NULL,
+            text TEXT NOT NULL,
+            suru_id TEXT NOT NULL,
+            headword TEXT,
+            sense_group INTEGER NOT NULL,
+            position INTEGER NOT NULL
+        )""")
+    count = 0
+    for row in zip(df['suru_id'], df['headword'], df['translations'], df['sense_groups']):
+        rows = list(index_rows(*row))
+        db.executemany("INSERT INTO translations VALUES (?, ?, ?, ?, ?, ?)", rows)
+        count += len(rows)
+    # Build the index after the inserts, which is faster than keeping it up to date
+    db.execute("CREATE INDEX translations_term ON translations (term)")
+    db.commit()
+    db.close()
+    os.replace(tmp_path, index_path)
+    print(f"Indexed {count} translations of {len(df)} entries in {time.perf_counter() - start:.1f}s: {index_path}")
+
+class TranslationIndex:
+    """
+    Read access to an index built with build_index: which SuRu entries
+    translate to a Swedish term.
+    """
+    def __init__(self, path=DEFAULT_PATH):
+        self._db = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+
+    def lookup(self, term):
+        """
+        Entries with the Swedish term, e.g. lookup('hus'), in SuRu ID order.
+        sense_group is 0 for the entry's translations and 1... for its sense groups.
+        """
+        rows = self._db.execute(
+            "SELECT suru_id, headword, sense_group, position, text FROM translations WHERE term = ? "
+            "ORDER BY suru_id, sense_group, position", (normalize_term(term),)).fetchall()
+        return [{'suru_id': suru_id, 'headword': headword, 'sense_group': sense_group, 'position': position, 'text': text}
+                for suru_id, headword, sense_group, position, text in rows]
+
+    def suru_ids(self, term):
+        return list(dict.fromkeys(row['suru_id'] for row in self.lookup(term)))
+
+def open_index(path=DEFAULT_PATH):
+    """
+    The translation index at path, or None if it has not been built.
+    """
+    if not os.path.exists(path):
+        return None
+    return TranslationIndex(path)
+
+if __name__ == "__main__":
+    # Imported here so the Flask server does not load pandas
+    from suru_store import read_table
+
+    parser = argparse.ArgumentParser(description="Build the Swedish to Finnish translation index from the output of step 3")
+    parser.add_argument('--input', default='03_suru', help='Extracted SuRu table (default: 03_suru)')
+    parser.add_argument('--output', default=DEFAULT_PATH, help=f'Index file (default: {DEFAULT_PATH})')
+    args = parser.parse_args()
+    build_index(read_table(args.input, columns=['suru_id', 'headword', 'translations', 'sense_groups']), args.output)
@@ -0,0 +1,315 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+API_URL = "https://www.wikidata.org/w/api.php"
+SPARQL_URL = "https://query.wikidata.org/sparql"
+USER_AGENT = 'SuruWikidataBot/1.0 (https://github.com/robertsilen/suru-wikidata)'
+# Ask the API to refuse requests while replication lag is above this many seconds
+MAXLAG = 5
+MAX_RETRIES = 5
+
+class OfflineCacheMiss(Exception):
+    """
+    Raised in offline mode when a request is not in the cache.
+    """
+
+class ResponseCache:
+    """
+    On-disk cache of JSON responses in SQLite, keyed on endpoint and parameters.
+    Entries older than ttl seconds are treated as missing. When the stored
+    responses exceed max_bytes, the least recently used ones are evicted.
+    """
+    def __init__(self, path='wikidata_cache.sqlite', ttl=30 * 24 * 3600, max_bytes=1024 ** 3):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._puts = 0
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                body TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                accessed REAL NOT NULL
+            )""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        self._db.commit()
+
+    @staticmethod
+    def make_key(url, params):
+        return url + '?' + json.dumps(params, sort_keys=True, ensure_ascii=False)
+
+    def get(self, url, params):
+        return self.get_with_age(url, params)[0]
+
+    def get_with_age(self, url, params):
+        """
+        The cached response and its age in seconds, or (None, None).
+        """
+        key = self.make_key(url, params)
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT body, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                self.misses += 1
+                return None, None
+            self._db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        return json.loads(row[0]), now - row[1]
+
+    def put(self, url, params, data):
+        key = self.make_key(url, params)
+        body = json.dumps(data, ensure_ascii=False)
+        now = time.time()
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                             (key, body, len(body), now, now))
+            self._puts += 1
+            if self._puts % 100 == 0:
+                self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        now = time.time()
+        self._db.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Delete least recently used entries until below max_bytes
+        for key, size in self._db.execute("SELECT key, size FROM responses ORDER BY accessed").fetchall():
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def close(self):
+        with self._lock:
+            self._db.commit()
+            self._db.close()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        ratio = self.hits / lookups if lookups else 0.0
+        return f"Cache: {self.hits} hits, {self.misses} misses ({ratio:.0%} hit ratio)"
+
+class TokenBucket:
+    """
+    Thread-safe token bucket allowing rate requests per second on average and
+    bursts of up to capacity requests. pause() stops all requests for a while,
+    e.g. on maxlag or Retry-After replies.
+    """
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now >= self.blocked_until:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+                else:
+                    wait = self.blocked_until - now
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+            self.updated = self.blocked_until
+            self.tokens = 0
+
+session = requests.Session()
+session.headers.update({'User-Agent': USER_AGENT})
+cache = None
+offline = False
+offline_misses = 0
+_misses_lock = threading.Lock()
+rate_limiter = None
+executor = None
+
+def add_api_arguments(parser):
+    """
+    Add the shared Wikidata API and cache options to an argparse parser.
+    """
+    parser.add_argument('--api-url', default=API_URL,
+                        help=f'Wikidata API endpoint, e.g. a local stand-in server (default: {API_URL})')
+    parser.add_argument('--sparql-url', default=SPARQL_URL,
+                        help=f'SPARQL endpoint, e.g. a local fixture server (default: {SPARQL_URL})')
+    parser.add_argument('--cache', default='wikidata_cache.sqlite',
+                        help='Response cache file (default: wikidata_cache.sqlite)')
+    parser.add_argument('--no-cache', action='store_true', help='Do not cache responses')
+    parser.add_argument('--cache-ttl', type=float, default=30,
+                        help='Days before a cached response is fetched again (default: 30)')
+    parser.add_argument('--cache-max-mb', type=float, default=1024,
+                        help='Evict least recently used responses above this size (default: 1024)')
+    parser.add_argument('--offline', action='store_true',
+                        help='Serve responses only from the cache, never from the network')
+    parser.add_argument('--concurrency', type=int, default=4,
+                        help='Number of concurrent requests (default: 4)')
+    parser.add_argument('--rate', type=float, default=5,
+                        help='Maximum requests per second to the network (default: 5)')
+
+def configure(api_url=API_URL, cache_path='wikidata_cache.sqlite', ttl_days=30, max_mb=1024, offline_mode=False,
+              concurrency=4, rate=5, sparql_url=SPARQL_URL):
+    global API_URL, SPARQL_URL, cache, offline, rate_limiter, executor
+    API_URL = api_url
+    SPARQL_URL = sparql_url
+    cache = ResponseCache(cache_path, ttl_days * 24 * 3600, int(max_mb * 1024 ** 2)) if cache_path else None
+    offline = offline_mode
+    if offline and cache is None:
+        raise ValueError("Offline mode needs a cache")
+    rate_limiter = TokenBucket(rate) if rate else None
+    # Keep one pooled keep-alive connection per concurrent request
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=concurrency)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='wikidata')
+
+def configure_from_args(args):
+    configure(args.api_url, None if args.no_cache else args.cache, args.cache_ttl, args.cache_max_mb, args.offline,
+              args.concurrency, args.rate, args.sparql_url)
+
+def retry_after(response, default=5):
+    try:
+        return float(response.headers.get('Retry-After', default))
+    except ValueError:
+        return default
+
+def endpoint_name(url, params):
+    # Metrics label of a request: the API action, or 'sparql'
+    if 'action' in params:
+        return params['action']
+    return 'sparql' if 'query' in params else url
+
+def fetch_json(url, params, method='GET'):
+    """
+    GET (or POST) a JSON response from the network, respecting the rate limit. API
+    requests carry maxlag; maxlag errors, 429 and 503 replies pause all
+    requests for Retry-After seconds and are retried.
+    """
+    request_params = dict(params)
+    if 'action' in params:
+        request_params['maxlag'] = MAXLAG
+    endpoint = endpoint_name(url, params)
+    for attempt in range(MAX_RETRIES + 1):
+        if rate_limiter is not None:
+            with metrics.timer('rate_limit_wait', endpoint=endpoint):
+                rate_limiter.acquire()
+        with metrics.timer('http_request', endpoint=endpoint):
+            if method == 'POST':
+                response = session.post(url, data=request_params, headers={'Accept': 'application/sparql-results+json'})
+            else:
+                response = session.get(url, params=request_params)
+        metrics.inc('http_requests', endpoint=endpoint, status=response.status_code)
+        if response.status_code in (429, 503):
+            wait = retry_after(response)
+            reason = str(response.status_code)
+        else:
+            response.raise_for_status()
+            data = response.json()
+            if data.get('error', {}).get('code') != 'maxlag':
+                return data
+            wait = retry_after(response)
+            reason = 'maxlag'
+        metrics.inc('http_retries', endpoint=endpoint, reason=reason)
+        if attempt == MAX_RETRIES:
+            break
+        print(f"Throttled by {url} (status {response.status_code}), waiting {wait:.0f}s")
+        if rate_limiter is not None:
+            rate_limiter.pause(wait)
+        else:
+            time.sleep(wait)
+    raise RuntimeError(f"Giving up after {MAX_RETRIES} retries: {url} {params}")
+
+def get_json(params, url=None, method='GET'):
+    """
+    GET (or POST) a JSON response, served from the cache when possible.
+    Only successful responses without an 'error' key are cached.
+    """
+    url = url or API_URL
+    if cache is not None:
+        data = cache.get(url, params)
+        metrics.inc('cache_lookups', result='miss' if data is None else 'hit')
+        if data is not None:
+            return data
+    if offline:
+        global offline_misses
+        with _misses_lock:
+            offline_misses += 1
+        metrics.inc('offline_misses')
+        raise OfflineCacheMiss(f"Not in cache: {ResponseCache.make_key(url, params)}")
+
+    data = fetch_json(url, params, method)
+    if cache is not None and 'error' not in data:
+        cache.put(url, params, data)
+    return data
+
+def sparql_literal(text, lang=None):
+    """
+    text as a quoted SPARQL string literal, with a language tag if lang is given.
+    """
+    escaped = text.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n').replace('\r', '\\r')
+    return f'"{escaped}"@{lang}' if lang else f'"{escaped}"'
+
+def sparql_query(query, url=None):
+    """
+    Run a SPARQL query (POSTed, so long VALUES blocks fit) and return its bindings.
+    """
+    data = get_json({'query': query, 'format': 'json'}, url or SPARQL_URL, 'POST')
+    return data['results']['bindings']
+
+async def get_json_async(params, url=None):
+    """
+    get_json for asyncio code, run in the pooled worker threads.
+    """
+    return await asyncio.get_running_loop().run_in_executor(executor, get_json, params, url)
+
+def get_entities(ids, batch_size=50):
+    """
+    Fetch entities with wbgetentities, batch_size ids per request.
+    Returns a dict from id to entity; missing entities are left out.
+    """
+    ids = list(dict.fromkeys(ids))
+    entities = {}
+    for start in range(0, len(ids), batch_size):
+        params = {
+            "action": "wbgetentities",
+            "ids": '|'.join(ids[start:start + batch_size]),
+            "format": "json"
+        }
+        data = get_json(params)
+        for entity_id, entity in data.get('entities', {}).items():
+            if 'missing' not in entity:
+                entities[entity_id] = entity
+    return entities
+
+def print_stats():
+    if cache is not None:
+        print(cache.stats())
+    if offline:
+        print(f"Offline cache misses, treated as no result: {offline_misses}")
+
+def close():
+    if cache is not None:
+        cache.close()
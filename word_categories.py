@@ -0,0 +1,79 @@
+import os
+import re
+import unicodedata
+import pandas as pd
+
+from suru_store import read_table, table_path, write_table
+
+WORD_LIST = 'nykysuomensanalista2024.txt'
+INDEX_NAME = 'word_categories'
+
+# Homonym numbers around a word: "¹kuusi", "kuusi¹", "kuusi (1)". Plain digits are
+# part of the word ("B12", "100 metrin juoksu"); the word list has homonyms in its own column.
+HOMONYM = re.compile(r'^[⁰¹²³⁴⁵⁶⁷⁸⁹]+\s*|(?<=\S)\s*(\([0-9]+\)|[⁰¹²³⁴⁵⁶⁷⁸⁹]+)$')
+
+def normalize_key(word):
+    """
+    Lookup key of a word: NFC-normalized, whitespace collapsed and homonym number removed.
+    """
+    if not isinstance(word, str):
+        return None
+    word = unicodedata.normalize('NFC', ' '.join(word.split()))
+    return HOMONYM.sub('', word) or None
+
+def build_index(word_list=WORD_LIST):
+    """
+    Index of the word list: one row per normalized key with its word
+    categories (Sanaluokka) in list order, and the case-folded key.
+    """
+    words = pd.read_csv(word_list, sep='\t', usecols=['Hakusana', 'Sanaluokka'], dtype=str)
+    words['key'] = words['Hakusana'].map(normalize_key)
+    words = words.dropna(subset=['key', 'Sanaluokka']).drop_duplicates(subset=['key', 'Sanaluokka'])
+    index = words.groupby('key', sort=False)['Sanaluokka'].agg(list).reset_index()
+    index['folded'] = index['key'].str.casefold()
+    return index
+
+def load_index(word_list=WORD_LIST, name=INDEX_NAME):
+    """
+    The persisted index of word_list, rebuilt when the word list or the key
+    normalization in this module is newer.
+    """
+    path = table_path(name)
+    if os.path.exists(path) and os.path.getmtime(path) >= max(os.path.getmtime(word_list), os.path.getmtime(__file__)):
+        return read_table(name)
+    print(f"Building word category index from {word_list}")
+    index = build_index(word_list)
+    write_table(index, name)
+    return index
+
+def lookup_categories(headwords, index):
+    """
+    Word categories of each headword as a list (empty if not found). Exact
+    normalized keys are looked up first, then case-insensitively.
+    Returns the categories and match counts.
+    """
+    keys = headwords.map(normalize_key)
+    exact = keys.map(index.set_index('key')['Sanaluokka'])
+    # Only use case-folded keys that are not ambiguous
+    folded_index = index.drop_duplicates(subset=['folded'], keep=False).set_index('folded')['Sanaluokka']
+    folded = keys.str.casefold().map(folded_index)
+    categories = exact.where(exact.notna(), folded)
+
+    matched = categories.notna()
+    stats = {
+        'entries': len(headwords),
+        'matched': int(matched.sum()),
+        'exact': int((exact.notna() & (keys == headwords)).sum()),
+        'normalized': int((exact.notna() & (keys != headwords)).sum()),
+        'case_insensitive': int((exact.isna() & folded.notna()).sum()),
+        'multiple_categories': int(categories[matched].map(len).gt(1).sum()),
+        'unmatched': int((~matched).sum()),
+    }
+    categories = categories.map(lambda value: value if isinstance(value, list) else [])
+    return categories, stats
+
+def print_match_rates(stats):
+    total = stats['entries'] or 1
+    print(f"Word categories found for {stats['matched']} / {stats['entries']} entries ({stats['matched'] / total:.1%})")
+    for name in ['exact', 'normalized', 'case_insensitive', 'multiple_categories', 'unmatched']:
+        print(f"  {name}: {stats[name]} ({stats[name] / total:.1%})")